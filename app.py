@@ -1,30 +1,119 @@
 # Import dependencies -- reuse code others have given us.
-import sqlite3
+import functools
+import hashlib
 import os
+import time
 from markupsafe import escape
 import datetime
-from flask import Flask, render_template, request, url_for, redirect, abort, g
+from flask import Flask, Response, make_response, render_template, stream_template, request, url_for, redirect, abort, g
+
+import metrics
+from cache import PAGE_CACHE_BYTES, ReadThroughCache, make_backend
+from db import data_version, get_pool
+from migrations import migrate
+from import_products import READERS, format_for, text_stream, import_products as run_import
+from supplier_index import SupplierIndex
 
 app = Flask("app")
+metrics.init_app(app)
 
 # The database configuration
 DATABASE = os.environ.get("FLASK_DATABASE", "app.db")
 
+# Listing pages are served in pages of `limit` rows, continuing after the key in `after`.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+# Read-through caches for product lookups.  Their keys include the products data
+# version, so a write from any process (add_product, an import, the import CLI)
+# makes the old entries unreachable.  The listing cache serves asgi_app.py; the
+# WSGI /products/ route is cached whole in response_cache instead.
+product_cache = ReadThroughCache("product")
+products_listing_cache = ReadThroughCache("products")
+
+# Suppliers grouped with their address lines, rebuilt only after a write.
+supplier_index = SupplierIndex()
+
+def page_size(entry):
+    """The size of a response_cache entry: the length of its body; the generation counter weighs nothing."""
+    return len(entry[1]) if isinstance(entry, tuple) else 0
+
+
+# Rendered pages, keyed by path, query string and the version of the data they show,
+# and bounded by the total size of their bodies.
+response_cache = ReadThroughCache("pages", make_backend(PAGE_CACHE_BYTES, page_size))
+
+# Databases already brought up to date by migrations.migrate() in this process.
+_migrated = set()
+
 
 # Functions to help connect to the database
 # And clean up when this application ends.
+# Connections come from a shared pool and go back to it when the request ends.
 def get_db_connection():
     db = getattr(g, "_database", None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
+        db = g._database = get_pool(DATABASE).acquire()
+        if DATABASE not in _migrated:
+            migrate(db)
+            _migrated.add(DATABASE)
     return db
 
 
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, "_database", None)
+    db = g.pop("_database", None)
     if db is not None:
-        db.close()
+        get_pool(DATABASE).release(db)
+
+
+def current_version(name):
+    """Return the data version of one of the migrations.DATA_VERSIONS groups of tables."""
+    return data_version(get_db_connection(), name)
+
+
+def cached_page(version):
+    """
+    Serve a view from response_cache, with a strong ETag and 304s for If-None-Match.
+
+    `version` is called on every request and returns a value that changes
+    whenever the page would render differently; together with the path and
+    query string it forms the cache key.  Streamed responses are never cached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if "stream" in request.args:
+                return view(*args, **kwargs)
+
+            def render():
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return None
+                body = response.get_data()
+                return hashlib.blake2b(body, digest_size=16).hexdigest(), body, response.mimetype
+
+            key = (request.path, request.query_string, version())
+            entry = response_cache.get_or_load(key, render)
+            if entry is None:
+                response_cache.invalidate(key)
+                return view(*args, **kwargs)
+            etag, body, mimetype = entry
+            response = Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def static_version():
+    return 0
+
+
+def clock_version():
+    # Pages that show the current time are rendered at most once a second.
+    return int(time.time())
 
 
 # Each @app.route(...) indicates a URL.
@@ -80,43 +169,144 @@ def greet_user2(user_id):
         abort(404)
 
 @app.route("/index_v2/")
+@cached_page(clock_version)
 def index_v2():
     return render_template("index_v2.html", utc_dt=datetime.datetime.utcnow())
 
 
 @app.route("/index_v3/")
+@cached_page(clock_version)
 def index_v3():
     return render_template("index_v3.html", utc_dt=datetime.datetime.utcnow())
 
 
 @app.route("/about_v2/")
+@cached_page(static_version)
 def about_v2():
     return render_template("about_v2.html")
 
 
+def page_args(args):
+    """Read the `after`, `limit` and `stream` query arguments of a listing page; `after` is None on the first page."""
+    try:
+        after = int(args["after"]) if "after" in args else None
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400)
+    if limit < 1:
+        abort(400)
+    stream = args.get("stream", "0").lower() in ("1", "true", "yes")
+    if not stream:
+        limit = min(limit, MAX_PAGE_SIZE)
+    elif "limit" not in args:
+        limit = None
+    return after, limit, stream
+
+
+def iter_rows(cursor, batch_size=STREAM_BATCH_SIZE):
+    """Yield the rows of a cursor a batch at a time instead of fetching them all."""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+# Queries shared by the WSGI routes below and the async routes in asgi_app.py.
+def rows_query(table, key, after, limit=None):
+    """Return the SQL and parameters of load_rows(); migrations.py explains the same query."""
+    if after is None:
+        sql, params = "SELECT * FROM {0} ORDER BY {1}".format(table, key), ()
+    else:
+        sql, params = "SELECT * FROM {0} WHERE {1} > ? ORDER BY {1}".format(table, key), (after,)
+    if limit is None:
+        return sql, params
+    return sql + " LIMIT ?", params + (limit,)
+
+
+def load_rows(conn, table, key, after, limit=None):
+    """
+    Return a cursor over up to `limit` rows of `table` with `key` greater than `after`, in key order.
+
+    An `after` of None starts from the first row, whatever its key: imported
+    rows may have keys of 0 or less.
+    """
+    return conn.execute(*rows_query(table, key, after, limit))
+
+
+def load_page(conn, table, key, after, limit):
+    """Return one page of rows as tuples, and the key to continue after (None on the last page)."""
+    # Fetch one row more than asked for to find out whether there is a next page.
+    rows = load_rows(conn, table, key, after, limit + 1).fetchall()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1][key]
+    return [tuple(row) for row in rows], next_after
+
+
+PRODUCT_QUERY = "SELECT * FROM products WHERE product_id=?"
+
+
+def load_product(conn, pid):
+    return [tuple(row) for row in conn.execute(PRODUCT_QUERY, (pid,))]
+
+
+def insert_product(conn, form):
+    """Insert a product from the add_product form and invalidate the product caches."""
+    conn.execute(
+        "INSERT INTO products VALUES (?,?,?,?,?,?,?,?)",
+        (
+            form["product_id"],
+            form["supplier_id"],
+            form["quantity"],
+            form["short_description"],
+            form["long_description"],
+            form["minimum_age"],
+            form["input_unit_price"],
+            form["shopper_unit_price"],
+        ),
+    )
+    conn.commit()
+    product_cache.invalidate_all()
+    products_listing_cache.invalidate_all()
+
+
+def render_listing(template, name, table, key):
+    """
+    Render one keyset page of `table`, ordered by its `key` column.
+
+    With ?stream=1 the rows are read from a cursor and the template is rendered
+    incrementally, so memory use does not grow with the size of the table.
+    """
+    after, limit, stream = page_args(request.args)
+    conn = get_db_connection()
+    if stream:
+        cursor = load_rows(conn, table, key, after, limit)
+        return stream_template(template, **{name: iter_rows(cursor), "next_after": None, "limit": limit})
+
+    rows, next_after = load_page(conn, table, key, after, limit)
+    return render_template(template, **{name: rows, "next_after": next_after, "limit": limit})
+
+
 @app.route("/suppliers/")
+@cached_page(lambda: current_version("suppliers"))
 def suppliers():
-    conn = get_db_connection()
-    supps = conn.execute("SELECT * FROM suppliers").fetchall()
-    conn.close()
-    return render_template("suppliers.html", suppliers=supps)
+    return render_listing("suppliers.html", "suppliers", "suppliers", "supplier_id")
 
 
 @app.route("/suppliers_v2/")
+@cached_page(lambda: current_version("suppliers"))
 def suppliers_v2():
-    conn = get_db_connection()
-    supps = conn.execute(
-        "select A.supplier_id, A.supplier_name, B.line_no, B.line_text from suppliers as A inner join addresses as B on B.address_id == A.supplier_address ORDER BY A.supplier_id, B.line_no"
-    ).fetchall()
-    conn.close()
-    return render_template("suppliers_v2.html", suppliers=supps)
+    # `suppliers` keeps the joined rows the template has always received; the grouped view is extra.
+    rows, groups = supplier_index.rows_and_suppliers(get_db_connection())
+    return render_template("suppliers_v2.html", suppliers=rows, supplier_groups=groups)
 
 @app.route("/products/")
+@cached_page(lambda: current_version("products"))
 def products():
-    conn = get_db_connection()
-    prods = conn.execute("SELECT * FROM products").fetchall()
-    conn.close()
-    return render_template("products.html", products=prods)
+    # Not cached in products_listing_cache as well: cached_page already keys the page by the same version.
+    return render_listing("products.html", "products", "products", "product_id")
 
 
 @app.route("/product/")
@@ -127,39 +317,73 @@ def product():
             s_pid=args.get("pid")
             i_pid=int(args.get("pid"))
             conn = get_db_connection()
-            prod = conn.execute("SELECT * FROM products WHERE product_id=?",(i_pid,)).fetchall()
-            conn.close()
+            prod = product_cache.get_or_load((current_version("products"), i_pid), lambda: load_product(conn, i_pid))
             return render_template("product.html", product=prod)
         except:            
             abort(404)        
     else:
-        conn = get_db_connection()
-        prods = conn.execute("SELECT * FROM products").fetchall()
-        conn.close()        
-        return render_template("products.html", products=prods)
+        return products()
 
 @app.route("/add_product/", methods=("GET", "POST"))
 def add_product():
     if request.method == "POST":
-        conn = get_db_connection()
-        supps = conn.execute(
-            "INSERT INTO products VALUES (?,?,?,?,?,?,?,?)",
-            (
-                request.form["product_id"],
-                request.form["supplier_id"],
-                request.form["quantity"],
-                request.form["short_description"],
-                request.form["long_description"],
-                request.form["minimum_age"],
-                request.form["input_unit_price"],
-                request.form["shopper_unit_price"],
-            ),
-        )
-        conn.commit()
-        conn.close()
+        insert_product(get_db_connection(), request.form)
         return redirect(url_for("products"))
     return render_template("add_product.html")
 
 
+@app.route("/import_products/", methods=("POST",))
+def import_products():
+    """
+    Bulk import products from an uploaded CSV or JSON Lines file.
+
+    The file is sent as the `file` form field, or as the raw request body.  The
+    format comes from ?format=csv|jsonl, else from the file name, else CSV.
+    The response is the import report, with status 400 if some lines were not
+    valid UTF-8, CSV or JSON.
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        raw, filename = upload.stream, upload.filename
+    else:
+        raw, filename = request.stream, None
+    fmt = request.args.get("format") or format_for(filename)
+    if fmt not in READERS:
+        abort(400)
+
+    report = run_import(get_db_connection(), READERS[fmt](text_stream(raw)))
+    if report["inserted"]:
+        product_cache.invalidate_all()
+        products_listing_cache.invalidate_all()
+    # Lines that could not be decoded or parsed make it a bad request; the rows that could be were imported.
+    return report, 400 if report["malformed"] else 200
+
+
+@app.route("/pool_stats/")
+def pool_stats():
+    """Return the database connection pool counters as JSON."""
+    return get_pool(DATABASE).stats()
+
+
+def pool_samples():
+    stats = get_pool(DATABASE).stats()
+    for state in ("in_use", "idle", "open"):
+        yield "app_db_pool_connections", "gauge", "Pooled database connections by state.", (("state", state),), stats[state]
+    yield "app_db_pool_waits_total", "counter", "Checkouts that had to wait for a free connection.", (), stats["waits"]
+
+
+metrics.registry.add_collector(pool_samples)
+
+
+@app.route("/cache_stats/")
+def cache_stats():
+    """Return hit/miss/eviction counters of the product and page caches as JSON."""
+    return {
+        "product": product_cache.stats(),
+        "products": products_listing_cache.stats(),
+        "pages": response_cache.stats(),
+    }
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,205 @@
+"""
+The routes of app.py served as an ASGI application.
+
+Handlers are coroutines, database work runs on a thread pool (db.AsyncPool)
+and templates are rendered by Jinja's async mode, so one process can keep
+thousands of slow clients open without a thread per client.  Requires
+Quart and an ASGI server:
+
+    pip install quart uvicorn
+    uvicorn asgi_app:app --port 5001
+"""
+import datetime
+import tempfile
+
+from quart import Quart, render_template, stream_template, request, url_for, redirect, abort
+
+import app as wsgi
+from db import AsyncPool, data_version, get_pool
+from migrations import migrate
+from import_products import READERS, format_for, text_stream, import_products as run_import
+
+app = Quart("app")
+
+db = AsyncPool(get_pool(wsgi.DATABASE))
+
+
+@app.before_serving
+async def migrate_database():
+    await db.run(migrate)
+
+# Request bodies larger than this are spooled to disk while they are received.
+SPOOL_SIZE = 1024 * 1024
+
+
+def fetch_rows(conn, table, key, after, limit):
+    return wsgi.load_rows(conn, table, key, after, limit).fetchall()
+
+
+async def stream_rows(table, key, after, limit):
+    """Yield rows in keyset batches; each batch is a separate query on the thread pool."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        batch_size = wsgi.STREAM_BATCH_SIZE if remaining is None else min(wsgi.STREAM_BATCH_SIZE, remaining)
+        rows = await db.run(fetch_rows, table, key, after, batch_size)
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][key]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+async def render_listing(template, name, table, key, cache=None, version=None):
+    """
+    Async version of app.render_listing().
+
+    These routes have no page cache, so the page is looked up in `cache` first,
+    if one is given, under the data `version` of the table.
+    """
+    after, limit, stream = wsgi.page_args(request.args)
+    if stream:
+        rows = stream_rows(table, key, after, limit)
+        return await stream_template(template, **{name: rows, "next_after": None, "limit": limit})
+
+    if cache is not None:
+        rows, next_after = await cache.get_or_load_async(
+            (version, after, limit), lambda: db.run(wsgi.load_page, table, key, after, limit))
+    else:
+        rows, next_after = await db.run(wsgi.load_page, table, key, after, limit)
+    return await render_template(template, **{name: rows, "next_after": next_after, "limit": limit})
+
+
+# Routes that do no I/O reuse the WSGI view functions as they are.
+@app.route("/")
+@app.route("/index/")
+async def hello():
+    return wsgi.hello()
+
+
+@app.route("/about/")
+async def about():
+    return wsgi.about()
+
+
+@app.route("/capitalize/<word>/")
+async def capitalize(word):
+    return wsgi.capitalize(word)
+
+
+@app.route("/add/<int:n1>/<int:n2>/")
+async def add(n1, n2):
+    return wsgi.add(n1, n2)
+
+
+@app.route("/subtract/<int:n1>/<int:n2>/")
+async def subtract(n1, n2):
+    return wsgi.subtract(n1, n2)
+
+
+@app.route("/users/<int:user_id>/")
+async def greet_user(user_id):
+    return wsgi.greet_user(user_id)
+
+
+@app.route("/users_v2/<int:user_id>/")
+async def greet_user2(user_id):
+    return wsgi.greet_user2(user_id)
+
+
+@app.route("/index_v2/")
+async def index_v2():
+    return await render_template("index_v2.html", utc_dt=datetime.datetime.utcnow())
+
+
+@app.route("/index_v3/")
+async def index_v3():
+    return await render_template("index_v3.html", utc_dt=datetime.datetime.utcnow())
+
+
+@app.route("/about_v2/")
+async def about_v2():
+    return await render_template("about_v2.html")
+
+
+@app.route("/suppliers/")
+async def suppliers():
+    return await render_listing("suppliers.html", "suppliers", "suppliers", "supplier_id")
+
+
+@app.route("/suppliers_v2/")
+async def suppliers_v2():
+    rows, groups = await db.run(wsgi.supplier_index.rows_and_suppliers)
+    return await render_template("suppliers_v2.html", suppliers=rows, supplier_groups=groups)
+
+
+@app.route("/products/")
+async def products():
+    return await render_listing("products.html", "products", "products", "product_id", wsgi.products_listing_cache,
+                                await db.run(data_version, "products"))
+
+
+@app.route("/product/")
+async def product():
+    args = request.args
+    if "pid" not in args:
+        return await products()
+    try:
+        i_pid = int(args.get("pid"))
+    except ValueError:
+        abort(404)
+    version = await db.run(data_version, "products")
+    prod = await wsgi.product_cache.get_or_load_async((version, i_pid), lambda: db.run(wsgi.load_product, i_pid))
+    return await render_template("product.html", product=prod)
+
+
+@app.route("/add_product/", methods=("GET", "POST"))
+async def add_product():
+    if request.method == "POST":
+        form = await request.form
+        await db.run(wsgi.insert_product, form)
+        return redirect(url_for("products"))
+    return await render_template("add_product.html")
+
+
+@app.route("/import_products/", methods=("POST",))
+async def import_products():
+    """Async version of app.import_products(); the import itself runs on the thread pool."""
+    files = await request.files
+    upload = files.get("file")
+    if upload is not None:
+        raw, filename = upload.stream, upload.filename
+    else:
+        raw, filename = tempfile.SpooledTemporaryFile(SPOOL_SIZE), None
+        async for chunk in request.body:
+            raw.write(chunk)
+        raw.seek(0)
+    fmt = request.args.get("format") or format_for(filename)
+    if fmt not in READERS:
+        abort(400)
+
+    def run(conn):
+        with text_stream(raw) as stream:
+            return run_import(conn, READERS[fmt](stream))
+
+    report = await db.run(run)
+    if report["inserted"]:
+        wsgi.product_cache.invalidate_all()
+        wsgi.products_listing_cache.invalidate_all()
+    # Lines that could not be decoded or parsed make it a bad request; the rows that could be were imported.
+    return report, 400 if report["malformed"] else 200
+
+
+@app.route("/pool_stats/")
+async def pool_stats():
+    return get_pool(wsgi.DATABASE).stats()
+
+
+@app.route("/cache_stats/")
+async def cache_stats():
+    return wsgi.cache_stats()
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
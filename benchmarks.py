@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the web application and its database code.
+
+    python benchmarks.py cart --threads 32 --increments 200
+
+    # Compare the WSGI and ASGI modes; start both servers first, e.g.
+    #   flask --app app run --with-threads --port 5000
+    #   uvicorn asgi_app:app --port 5001
+    python benchmarks.py http http://127.0.0.1:5000 http://127.0.0.1:5001 --clients 1000 --hold 1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import cart
+from db import ConnectionPool
+from migrations import migrate
+
+LEGACY_INCREMENT = (
+    "UPDATE shopping_cart SET quantity=(SELECT 1+quantity from shopping_cart where customer_id=?1 and product_id=?2) "
+    "WHERE customer_id=?1 and product_id=?2"
+)
+
+
+def _hammer(pool, threads, increments, work):
+    """Run work(conn) `increments` times on each of `threads` threads; return elapsed seconds and errors."""
+    errors = []
+    start = threading.Barrier(threads + 1)
+
+    def writer():
+        try:
+            with pool.connection() as conn:
+                start.wait()
+                for _ in range(increments):
+                    work(conn)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    began = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - began, errors
+
+
+def bench_cart(args):
+    """Many threads increment one cart line; the final quantity must equal the number of increments."""
+    expected = args.threads * args.increments
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, work, setup in (
+            ("upsert", lambda conn: cart.increment(conn, 1, 1), None),
+            ("legacy", lambda conn: (conn.execute(LEGACY_INCREMENT, (1, 1)), conn.commit()),
+             "INSERT INTO shopping_cart VALUES (1, 1, 0)"),
+        ):
+            path = os.path.join(tmp, "{}.db".format(name))
+            pool = ConnectionPool(path, size=args.threads, busy_timeout=60)
+            with pool.connection() as conn:
+                migrate(conn)
+                if setup:
+                    conn.execute(setup)
+                    conn.commit()
+
+            seconds, errors = _hammer(pool, args.threads, args.increments, work)
+            with pool.connection() as conn:
+                row = conn.execute("SELECT quantity FROM shopping_cart WHERE customer_id = 1 AND product_id = 1").fetchone()
+            pool.close()
+
+            quantity = row[0] if row else 0
+            lost = expected - quantity
+            print("{:7} {:3} threads x {} increments: {:8.0f} updates/s, quantity {} (lost {}), {} errors".format(
+                name, args.threads, args.increments, expected / seconds, quantity, lost, len(errors)))
+            if name == "upsert" and (lost or errors):
+                failed = True
+    return 1 if failed else 0
+
+
+async def _slow_get(host, port, path, hold):
+    """GET path, trickling the request headers over `hold` seconds like a slow client."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write("GET {} HTTP/1.1\r\nHost: {}\r\n".format(path, host).encode())
+        await writer.drain()
+        if hold:
+            await asyncio.sleep(hold)
+        writer.write(b"Connection: close\r\n\r\n")
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def _load(url, clients, requests_per_client, hold, path):
+    parts = urlsplit(url)
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            began = time.perf_counter()
+            try:
+                status = await _slow_get(parts.hostname, parts.port or 80, path, hold)
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - began)
+            else:
+                errors += 1
+
+    began = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - began, sorted(latencies), errors
+
+
+def bench_http(args):
+    """Drive each server with the same number of concurrent (optionally slow) clients."""
+    for url in args.urls:
+        seconds, latencies, errors = asyncio.run(_load(url, args.clients, args.requests, args.hold, args.path))
+        if latencies:
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        else:
+            p50 = p99 = float("nan")
+        print("{:30} {:5} clients: {:8.0f} req/s, p50 {:7.1f} ms, p99 {:7.1f} ms, {} errors".format(
+            url, args.clients, len(latencies) / seconds, p50, p99, errors))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cart_parser = commands.add_parser("cart", help="concurrent cart increments against one SQLite file")
+    cart_parser.add_argument("--threads", type=int, default=32)
+    cart_parser.add_argument("--increments", type=int, default=200)
+    cart_parser.set_defaults(run=bench_cart)
+
+    http_parser = commands.add_parser("http", help="concurrent clients against running WSGI/ASGI servers")
+    http_parser.add_argument("urls", nargs="+", help="base URL of each server to compare")
+    http_parser.add_argument("--path", default="/products/")
+    http_parser.add_argument("--clients", type=int, default=200)
+    http_parser.add_argument("--requests", type=int, default=5, help="requests per client")
+    http_parser.add_argument("--hold", type=float, default=0.0, help="seconds each client takes to send its headers")
+    http_parser.set_defaults(run=bench_http)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
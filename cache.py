@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# The cache configuration
+CACHE_SIZE = int(os.environ.get("FLASK_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.environ.get("FLASK_CACHE_TTL", "300"))
+CACHE_SERVER = os.environ.get("FLASK_CACHE_SERVER")  # "host:port" of a memcached server
+PAGE_CACHE_BYTES = int(os.environ.get("FLASK_PAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    In-process cache that evicts the least recently used entry when full.
+
+    Entries older than `ttl` seconds are treated as missing.  A ttl of None
+    keeps entries until they are evicted or deleted.  With `maxbytes`, entries
+    are also evicted while the sizes that weigh(value) returns add up to more
+    than maxbytes; a single value larger than that is not kept at all.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, maxbytes=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.weigh = weigh
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        size = self.weigh(value) if self.weigh is not None else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (expires_at, value, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._bytes -= self._data.popitem(last=False)[1][2]
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = {"backend": "lru", "entries": len(self._data), "maxsize": self.maxsize,
+                     "evictions": self.evictions, "expirations": self.expirations}
+            if self.maxbytes is not None:
+                stats.update(bytes=self._bytes, maxbytes=self.maxbytes)
+            return stats
+
+
+class ClientBackend:
+    """
+    Cache backend for a memcached-style client (get/set/delete/flush_all).
+
+    Use this when several worker processes should share one cache, e.g. a
+    memcached server running next to the application.
+    """
+
+    def __init__(self, client, ttl=CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        raw = self.client.get(key)
+        if raw is None:
+            return default
+        return pickle.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(key, pickle.dumps(value), expire=int(self.ttl or 0))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def clear(self):
+        self.client.flush_all()
+
+    def stats(self):
+        return {"backend": type(self.client).__name__}
+
+
+def make_backend(maxbytes=None, weigh=None):
+    """
+    Return the shared cache server backend if one is configured, else an in-process LRU.
+
+    maxbytes and weigh bound the LRU as described in LRUCache; a cache server
+    enforces its own memory limit.
+    """
+    if CACHE_SERVER:
+        try:
+            from pymemcache.client.base import Client
+        except ImportError:
+            raise RuntimeError("FLASK_CACHE_SERVER is set but pymemcache is not installed.")
+        host, _, port = CACHE_SERVER.partition(":")
+        return ClientBackend(Client((host, int(port or 11211))))
+    return LRUCache(maxbytes=maxbytes, weigh=weigh)
+
+
+class ReadThroughCache:
+    """
+    A named cache in front of a loader function.
+
+    Keys are prefixed with the cache name and a generation number kept in the
+    backend, so invalidate_all() only has to bump the generation and works the
+    same for an in-process cache and a shared cache server.  The caller's key
+    itself is stored as a SHA-1 of its repr(), so it can be any value with a
+    stable repr(): ints, strings, bytes and tuples of them.
+    """
+
+    def __init__(self, name, backend=None):
+        self.name = name
+        self.backend = backend if backend is not None else make_backend()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _generation(self):
+        key = "{}:generation".format(self.name)
+        generation = self.backend.get(key)
+        if generation is None:
+            # Start from the clock rather than 0 so that losing the generation
+            # entry to eviction can never bring back keys from before a bump.
+            generation = time.time_ns()
+            self.backend.set(key, generation)
+        return generation
+
+    def _key(self, key):
+        # Keys are hashed because memcached rejects keys with whitespace or over
+        # 250 bytes, and tuple keys such as (after, limit) format with spaces.
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return "{}:{}:{}".format(self.name, self._generation(), digest)
+
+    def _lookup(self, full_key):
+        value = self.backend.get(full_key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() and storing its result on a miss."""
+        full_key = self._key(key)
+        value = self._lookup(full_key)
+        if value is _MISSING:
+            value = loader()
+            self.backend.set(full_key, value)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        """Like get_or_load(), for a loader that returns an awaitable."""
+        full_key = self._key(key)
+        value = self._lookup(full_key)
+        if value is _MISSING:
+            value = await loader()
+            self.backend.set(full_key, value)
+        return value
+
+    def invalidate(self, key):
+        self.invalidations += 1
+        self.backend.delete(self._key(key))
+
+    def invalidate_all(self):
+        self.invalidations += 1
+        self.backend.set("{}:generation".format(self.name), self._generation() + 1)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        snapshot = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+        snapshot.update(self.backend.stats())
+        return snapshot
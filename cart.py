@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import sqlite3
+
+# ON CONFLICT needs the unique cart index created by migrations.py (and SQLite 3.24 or later).
+UPSERT = (
+    "INSERT INTO shopping_cart (customer_id, product_id, quantity) VALUES (?, ?, MAX(?, 0)) "
+    "ON CONFLICT (customer_id, product_id) DO UPDATE SET quantity = MAX(quantity + ?, 0)"
+)
+# RETURNING (SQLite 3.35+) saves the follow-up SELECT of the new quantity.
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+DELETE_EMPTY = "DELETE FROM shopping_cart WHERE customer_id = ? AND product_id = ? AND quantity <= 0"
+
+
+def _begin(conn):
+    # Take the write lock up front so concurrent writers queue on busy_timeout
+    # instead of failing to upgrade a read lock.
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def change_quantity(conn, customer_id, product_id, delta):
+    """
+    Atomically add delta (which may be negative) to a cart line and return the new quantity.
+
+    A missing line is created; a line that drops to zero is removed.  The
+    read-modify-write happens inside a single UPSERT statement, so concurrent
+    callers never lose each other's updates.
+    """
+    try:
+        if HAS_RETURNING:
+            row = conn.execute(UPSERT + " RETURNING quantity", (customer_id, product_id, delta, delta)).fetchone()
+        else:
+            _begin(conn)
+            conn.execute(UPSERT, (customer_id, product_id, delta, delta))
+            row = conn.execute(
+                "SELECT quantity FROM shopping_cart WHERE customer_id = ? AND product_id = ?",
+                (customer_id, product_id),
+            ).fetchone()
+        quantity = row[0]
+        if quantity <= 0:
+            conn.execute(DELETE_EMPTY, (customer_id, product_id))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return quantity
+
+
+def increment(conn, customer_id, product_id, amount=1):
+    return change_quantity(conn, customer_id, product_id, amount)
+
+
+def decrement(conn, customer_id, product_id, amount=1):
+    return change_quantity(conn, customer_id, product_id, -amount)
+
+
+def apply_changes(conn, changes):
+    """
+    Apply many (customer_id, product_id, delta) changes in a single transaction.
+
+    Either every change is applied or, if any statement fails, none are.
+    """
+    changes = list(changes)
+    _begin(conn)
+    try:
+        conn.executemany(UPSERT, [(c, p, d, d) for c, p, d in changes])
+        # Every touched line is checked, as in change_quantity(), since a line may already hold 0.
+        conn.executemany(DELETE_EMPTY, {(c, p) for c, p, d in changes})
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(changes)
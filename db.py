@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+import asyncio
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metrics
+
+# The database configuration
+DATABASE = os.environ.get("FLASK_DATABASE", "app.db")
+POOL_SIZE = int(os.environ.get("FLASK_DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT = float(os.environ.get("FLASK_DB_BUSY_TIMEOUT", "5.0"))
+CHECKOUT_TIMEOUT = float(os.environ.get("FLASK_DB_CHECKOUT_TIMEOUT", "30.0"))
+HEALTH_CHECK_INTERVAL = float(os.environ.get("FLASK_DB_HEALTH_CHECK_INTERVAL", "30.0"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections.
+
+    A thread checks out at most one connection: calling acquire() again from
+    the same thread hands back the connection it already holds, so helpers can
+    nest without exhausting the pool.  Idle connections are checked with a
+    cheap query before they are handed out if they have been idle for longer
+    than health_check_interval seconds.
+    """
+
+    def __init__(self, database=DATABASE, size=POOL_SIZE, busy_timeout=BUSY_TIMEOUT,
+                 checkout_timeout=CHECKOUT_TIMEOUT, health_check_interval=HEALTH_CHECK_INTERVAL, factory=None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.database = database
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.factory = factory if factory is not None else metrics.connection_factory()
+
+        self._lock = threading.Condition()
+        self._idle = []  # (connection, time it was returned), most recent last
+        self._owners = {}  # thread ident -> [connection, nesting depth]
+        self._open = 0
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "checkouts": 0,
+            "reused_by_thread": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+            "discarded": 0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=self.busy_timeout, check_same_thread=False,
+                               factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout={}".format(int(self.busy_timeout * 1000)))
+        return conn
+
+    def _is_healthy(self, conn):
+        self._stats["health_checks"] += 1
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            self._stats["health_check_failures"] += 1
+            return False
+
+    def _discard(self, conn):
+        self._open -= 1
+        self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self):
+        """Check out a connection for the calling thread."""
+        ident = threading.get_ident()
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._lock:
+            if self._closed:
+                raise PoolTimeout("Connection pool for {} is closed.".format(self.database))
+            owned = self._owners.get(ident)
+            if owned is not None:
+                owned[1] += 1
+                self._stats["reused_by_thread"] += 1
+                return owned[0]
+
+            conn = None
+            while conn is None:
+                if self._idle:
+                    candidate, returned_at = self._idle.pop()
+                    stale = time.monotonic() - returned_at > self.health_check_interval
+                    if stale and not self._is_healthy(candidate):
+                        self._discard(candidate)
+                        continue
+                    conn = candidate
+                elif self._open < self.size:
+                    self._open += 1
+                    try:
+                        conn = self._connect()
+                    except sqlite3.Error:
+                        self._open -= 1
+                        raise
+                    self._stats["created"] += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout("No free connection for {} after {}s.".format(
+                            self.database, self.checkout_timeout))
+                    self._stats["waits"] += 1
+                    self._lock.wait(remaining)
+
+            self._owners[ident] = [conn, 1]
+            self._stats["checkouts"] += 1
+            return conn
+
+    def release(self, conn):
+        """Return a connection previously obtained with acquire()."""
+        ident = threading.get_ident()
+        with self._lock:
+            owned = self._owners.get(ident)
+            if owned is None or owned[0] is not conn:
+                raise ValueError("Connection was not checked out by this thread.")
+            owned[1] -= 1
+            if owned[1] > 0:
+                return
+            del self._owners[ident]
+
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+            else:
+                if self._closed:
+                    self._discard(conn)
+                else:
+                    self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager form of acquire()/release()."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Return a snapshot of the pool counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "database": self.database,
+                "size": self.size,
+                "open": self._open,
+                "in_use": len(self._owners),
+                "idle": len(self._idle),
+            })
+            return snapshot
+
+    def close(self):
+        """Close idle connections; busy ones are closed when released."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._lock.notify_all()
+
+
+class AsyncPool:
+    """
+    Run blocking database work from asyncio code.
+
+    run(fn, *args) calls fn(conn, *args) with a pooled connection on a worker
+    thread, so the event loop never waits on SQLite.  There is one worker per
+    pooled connection, so workers never wait for a checkout.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="sqlite")
+
+    def _call(self, fn, args):
+        with self.pool.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def data_version_statements(name, tables):
+    """
+    Return the SQL creating a counter in data_versions that triggers bump on every write to `tables`.
+
+    Readers compare data_version() with the value they last saw to find out
+    whether anything they derived from those tables is stale, even when the
+    write came from another process.
+    """
+    statements = [
+        "CREATE TABLE IF NOT EXISTS data_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO data_versions (name, version) VALUES ('{}', 0)".format(name),
+    ]
+    for table in tables:
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(
+                "CREATE TRIGGER IF NOT EXISTS {0}_{1}_{2}_version AFTER {3} ON {1} BEGIN "
+                "UPDATE data_versions SET version = version + 1 WHERE name = '{0}'; END".format(
+                    name, table, op.lower(), op))
+    return statements
+
+
+DATA_VERSION_QUERY = "SELECT version FROM data_versions WHERE name = ?"
+
+
+def data_version(conn, name):
+    """Return the current value of a data_versions counter, or None if it does not exist."""
+    row = conn.execute(DATA_VERSION_QUERY, (name,)).fetchone()
+    return row[0] if row else None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database=DATABASE):
+    """Return the process-wide pool for a database file, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None or pool._closed:
+            pool = _pools[database] = ConnectionPool(database)
+        return pool
+
+
+@atexit.register
+def _close_pools():
+    # Close idle connections at exit so SQLite can checkpoint the WAL file.
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
@@ -1,23 +1,118 @@
+import collections
+import concurrent.futures
+import os
+import threading
+
+from event_store import EventStore, LazyMapping
+from reports import event_report, generate_reports
+
+LOYALTY_POINTS_PER_SEAT = 10
+LOCK_STRIPES = 64
+
+# Outcomes of EventDatabase.register
+REGISTERED = 'registered'
+WAITLISTED = 'waitlisted'
+
+
+class RegistrationError(Exception):
+    """A registration that cannot be made; the message is meant for the user."""
+
+
+class EventNotFound(RegistrationError):
+    def __init__(self, event_id):
+        super().__init__(f"Event with ID '{event_id}' not found in the database.")
+        self.event_id = event_id
+
+
+class InvalidSeatCount(RegistrationError):
+    def __init__(self, seats):
+        super().__init__("Please enter a valid number of attendees (greater than zero).")
+        self.seats = seats
+
+
+class SeatBookings:
+    """
+    The seats booked for one event, one (attendee, seats) record per booking.
+
+    seats_taken is kept up to date as bookings are made, so the remaining
+    capacity of an event is known without counting anything, and a group
+    booking takes one record however many seats it is for.
+
+    Events read from an EventStore pass `load`, which fetches the records the
+    first time they are needed; callers hold the event's lock.
+    """
+
+    def __init__(self, seats_taken=0, load=None):
+        self._records = None if load else []
+        self._load = load
+        self.seats_taken = seats_taken
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = list(self._load())
+        return self._records
+
+    def book(self, attendee, seats):
+        # Records not loaded yet are fetched with this booking once it is stored.
+        if self._records is not None:
+            self._records.append((attendee, seats))
+        self.seats_taken += seats
+
+    def attendees(self):
+        """Attendee names, each once, in the order of their first booking."""
+        return list(dict.fromkeys(name for name, _ in self.records))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+
 class EventDatabase:
-    def __init__(self):
+    def __init__(self, store=None):
         """
         Initialize the EventDatabase with an empty dictionary to store events.
+
+        Parameters:
+        - store: (Optional) EventStore to keep events in; they are then loaded from it as they are used.
         """
-        self.events = {}
+        self.store = store
+        if store is None:
+            self.events = {}
+            self.customer_events = {}  # customer name -> {event_id: seats booked}
+            self.loyalty_points = {}  # customer name -> loyalty points earned
+        else:
+            self.events = LazyMapping(lambda event_id: store.load_event(event_id, SeatBookings), store.event_ids)
+            self.customer_events = LazyMapping(store.load_customer_events, store.customer_names)
+            self.loyalty_points = LazyMapping(store.load_loyalty_points, store.customer_names)
+        # Registrations for an event are checked and booked under its stripe lock;
+        # the customer indexes, shared by all events, under _customer_lock.  The
+        # store's lock is always taken last, so no other lock is ever waited for
+        # while a store transaction is open.
+        self._event_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._customer_lock = threading.Lock()
 
     def add_event(self, event_id, event_name, speaker_name=None, date=None, capacity=None):
-        if event_id not in self.events:
-            self.events[event_id] = {
-                'event_name': event_name,
-                'speaker_name': speaker_name,
-                'date': date,
-                'capacity': capacity,
-                'attendees': [],
-                'feedback': {
-                    'event_rating': None,
-                    'additional_comment': None
+        with self._event_lock(event_id):
+            added = event_id not in self.events
+            if added:
+                self.events[event_id] = {
+                    'event_name': event_name,
+                    'speaker_name': speaker_name,
+                    'date': date,
+                    'capacity': capacity,
+                    'bookings': SeatBookings(),
+                    'waitlist': collections.deque(),  # (attendee, seats) waiting for a seat to free up
+                    'feedback': {
+                        'event_rating': None,
+                        'additional_comment': None
+                    }
                 }
-            }
+                if self.store:
+                    self.store.save_event(event_id, self.events[event_id])
+        if added:
             print(f"Event '{event_name}' added to the database.")
         else:
             print(f"Event with ID '{event_id}' already exists in the database.")
@@ -30,9 +125,11 @@ class EventDatabase:
             self.events[event_id]['speaker_name'] = input("Enter Speaker Name (Optional): ")
             self.events[event_id]['date'] = input("Enter Date: ")
             self.events[event_id]['time'] = input("Enter Time: ")
-            self.events[event_id]['capacity'] = int(input("Enter Capacity: "))
+            promoted = self.set_capacity(event_id, int(input("Enter Capacity: ")))
 
             print(f"Event with ID '{event_id}' has been modified.")
+            for attendee_name, seats in promoted:
+                print(f"{attendee_name} has been registered from the waitlist for {seats} seat(s).")
         else:
             print(f"Event with ID '{event_id}' not found in the database.")
 
@@ -45,7 +142,11 @@ class EventDatabase:
             print(f"Date: {event_info['date']}")
             print(f"Time: {event_info.get('time', 'N/A')}")
             print(f"Capacity: {event_info['capacity']}")
-            print(f"Attendees: {', '.join(event_info['attendees'])}")
+            with self._event_lock(event_id):
+                bookings = list(event_info['bookings'])
+                waitlist = list(event_info['waitlist'])
+            print(f"Attendees: {', '.join(f'{name} ({seats})' for name, seats in bookings)}")
+            print(f"Waitlist: {', '.join(f'{name} ({seats})' for name, seats in waitlist)}")
             feedback_info = event_info['feedback']
             print(f"Event Rating: {feedback_info['event_rating']}")
             print(f"Additional Comment: {feedback_info['additional_comment']}")
@@ -69,25 +170,104 @@ class EventDatabase:
             event_info = self.events[event_id]
             attendee_name = input("Enter Your Name: ")
             num_attendees = int(input("Enter the Number of Attendees: "))
-            latest_capacity = event_info['capacity'] - len(event_info['attendees'])
 
-            if num_attendees <= latest_capacity and num_attendees > 0:
-                for _ in range(num_attendees):
-                    event_info['attendees'].append(attendee_name)
+            try:
+                outcome = self.register(event_id, attendee_name, num_attendees)
+            except RegistrationError as error:
+                print(error)
+                return
+            if outcome == REGISTERED:
                 print(f"Congratulations, {attendee_name}! You are registered for event '{event_info['event_name']}'.")
-            elif num_attendees <= 0:
-                print("Please enter a valid number of attendees (greater than zero).")
             else:
-                print(f"Sorry, {attendee_name}. The event '{event_info['event_name']}' is fully booked.")
+                print(f"Sorry, {attendee_name}. The event '{event_info['event_name']}' is fully booked. "
+                      "You have been added to the waitlist.")
         else:
             print(f"Event with ID '{event_id}' not found in the database.")
 
+    def _event_lock(self, event_id):
+        return self._event_locks[hash(event_id) % LOCK_STRIPES]
+
+    def register(self, event_id, attendee_name, seats):
+        """
+        Book seats for an attendee, or put them on the event's waitlist if there are not enough left.
+
+        Safe to call from many threads at once: the capacity check and the booking
+        happen under the event's lock, so an event is never overbooked.
+
+        Returns:
+        str: REGISTERED or WAITLISTED.
+
+        Raises:
+        EventNotFound, InvalidSeatCount
+        """
+        if not isinstance(seats, int) or seats <= 0:
+            raise InvalidSeatCount(seats)
+        with self._event_lock(event_id):
+            event_info = self.events.get(event_id)
+            if event_info is None:
+                raise EventNotFound(event_id)
+            if seats > self.remaining_capacity(event_id):
+                event_info['waitlist'].append((attendee_name, seats))
+                if self.store:
+                    self.store.add_to_waitlist(event_id, attendee_name, seats)
+                return WAITLISTED
+            self.book_seats(event_id, attendee_name, seats)
+            return REGISTERED
+
+    def set_capacity(self, event_id, capacity):
+        """
+        Change an event's capacity and book whoever on its waitlist now fits, first come first served.
+
+        Returns:
+        list: The (attendee, seats) bookings made from the waitlist.
+        """
+        with self._event_lock(event_id), self._customer_lock:
+            event_info = self.events[event_id]
+            event_info['capacity'] = capacity
+            promoted = []
+            still_waiting = collections.deque()
+            for attendee_name, seats in event_info['waitlist']:
+                if seats <= self.remaining_capacity(event_id):
+                    self._book(event_id, attendee_name, seats)
+                    promoted.append((attendee_name, seats))
+                else:
+                    still_waiting.append((attendee_name, seats))
+            event_info['waitlist'] = still_waiting
+            if self.store:
+                # Written once the bookings are made in memory, in one transaction.
+                self.store.change_capacity(event_id, event_info, [
+                    (attendee_name, seats, seats * LOYALTY_POINTS_PER_SEAT) for attendee_name, seats in promoted])
+            return promoted
+
+    def book_seats(self, event_id, attendee_name, seats):
+        """
+        Record a booking and credit the customer with its loyalty points.
+
+        The caller holds the event's lock and has checked that it has `seats` seats left.
+        """
+        with self._customer_lock:
+            self._book(event_id, attendee_name, seats)
+            if self.store:
+                self.store.add_booking(event_id, attendee_name, seats, seats * LOYALTY_POINTS_PER_SEAT)
+
+    def _book(self, event_id, attendee_name, seats):
+        # The caller holds the event's lock and _customer_lock, and stores the booking afterwards: memory
+        # is updated first so that a first lookup cannot load this booking from the store and then add it again.
+        self.events[event_id]['bookings'].book(attendee_name, seats)
+        booked = self.customer_events.setdefault(attendee_name, {})
+        booked[event_id] = booked.get(event_id, 0) + seats
+        self.loyalty_points[attendee_name] = self.loyalty_points.get(attendee_name, 0) + seats * LOYALTY_POINTS_PER_SEAT
+
+    def remaining_capacity(self, event_id):
+        event_info = self.events[event_id]
+        return event_info['capacity'] - event_info['bookings'].seats_taken
+
     def view_event_capacity(self):
         event_id = int(input("Enter Event ID to view capacity: "))
 
         if event_id in self.events:
             event_info = self.events[event_id]
-            latest_capacity = event_info['capacity'] - len(event_info['attendees'])
+            latest_capacity = self.remaining_capacity(event_id)
             print(f"The latest capacity for event '{event_info['event_name']}' is {latest_capacity}.")
         else:
             print(f"Event with ID '{event_id}' not found in the database.")
@@ -103,6 +283,8 @@ class EventDatabase:
             if 1 <= event_rating <= 10:
                 event_info['feedback']['event_rating'] = event_rating
                 event_info['feedback']['additional_comment'] = additional_comment[:150]
+                if self.store:
+                    self.store.save_event(event_id, event_info)
                 print("Thank you for your feedback!")
             else:
                 print("Please enter a valid event rating between 1 and 10.")
@@ -112,12 +294,8 @@ class EventDatabase:
     def customer_loyalty(self):
         customer_name = input("Enter Your Name: ")
 
-        total_registered_events = 0
-        total_loyalty_points = 0
-
-        for event_info in self.events.values():
-            total_registered_events += event_info['attendees'].count(customer_name)
-            total_loyalty_points += event_info['loyalty_points']
+        total_registered_events = len(self.customer_events.get(customer_name, {}))
+        total_loyalty_points = self.loyalty_points.get(customer_name, 0)
 
         print(f"{customer_name}, you have registered for {total_registered_events} events.")
         print(f"Total Loyalty Points: {total_loyalty_points}")
@@ -125,73 +303,128 @@ class EventDatabase:
     def generate_report(self):
         event_id = int(input("Enter Event ID to generate a report: "))
 
-        if event_id in self.events:
-            event_info = self.events[event_id]
-            latest_capacity = event_info['capacity']
-            total_capacity = latest_capacity
-            unique_attendees = set(event_info['attendees'])
-
-            print(f"Report for Event '{event_info['event_name']}' (Event ID: {event_id}):")
-            print(f"Latest Event Capacity: {latest_capacity}")
+        report = self.report_row(event_id)
+        if report is not None:
+            print(f"Report for Event '{report['event_name']}' (Event ID: {event_id}):")
+            print(f"Latest Event Capacity: {report['remaining_capacity']}")
             print("Attendees:")
-            for idx, attendee in enumerate(unique_attendees):
+            for attendee in report['attendees']:
                 print(f"- {attendee}")
-            print(f"\nTotal Capacity of Event Attendees: {total_capacity}")
+            print(f"\nTotal Capacity of Event Attendees: {report['capacity']}")
             print("\nCustomer Feedback:")
-            for idx, attendee in enumerate(unique_attendees):
-                feedback_info = event_info['feedback']
-                print(f"{idx + 1}. Attendee: {attendee}")
-                print(f"   Event Rating: {feedback_info['event_rating']}")
-                print(f"   Additional Comment: {feedback_info['additional_comment']}")
+            print(f"   Event Rating: {report['event_rating']}")
+            print(f"   Additional Comment: {report['additional_comment']}")
         else:
             print(f"Event with ID '{event_id}' not found in the database.")
 
+    def report_row(self, event_id):
+        """The report row of an event (see reports.REPORT_FIELDS), or None if there is no such event."""
+        event_info = self.events.get(event_id)
+        if event_info is None:
+            return None
+        with self._event_lock(event_id):
+            return event_report(event_id, event_info)
+
+    def export_reports(self):
+        path = input("Enter Report File (.csv or .jsonl): ")
+        event_ids = input("Enter Event IDs separated by commas (leave blank for all events): ")
+        event_ids = [int(event_id) for event_id in event_ids.split(',')] if event_ids.strip() else None
+
+        try:
+            written = generate_reports(self, path, event_ids)
+        except ValueError as error:
+            print(error)
+            return
+        print(f"{written} event reports written to '{path}'.")
+
+
+class RegistrationEngine:
+    """
+    Serves registrations from many clients on a pool of worker threads.
+
+        with RegistrationEngine(event_db, workers=32) as engine:
+            future = engine.submit(event_id, "Ann", 2)
+            future.result()  # REGISTERED or WAITLISTED, or raises RegistrationError
+    """
+
+    def __init__(self, event_db, workers=32):
+        self.event_db = event_db
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='registration')
+
+    def submit(self, event_id, attendee_name, seats):
+        return self._pool.submit(self.event_db.register, event_id, attendee_name, seats)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 # Text-based interface
-event_db = EventDatabase()
-
-while True:
-    print("\nSelect an option:")
-    print("1. Create Event")
-    print("2. Modify Event")
-    print("3. Display Event Info")
-    print("4. Register Event")
-    print("5. View Event Capacity")
-    print("6. Customer Feedback")
-    print("7. Customer Loyalty")
-    print("8. Generate Report")
-    print("9. Exit")
-
-    choice = input("Enter your choice (1-9): ")
-
-    if choice == '1':
-        # Create Event
-        event_db.create_event()
-    elif choice == '2':
-        # Modify Event
-        event_id = int(input("Enter Event ID to modify: "))
-        event_db.modify_event(event_id)
-    elif choice == '3':
-        # Display Event Info
-        event_id = int(input("Enter Event ID: "))
-        event_db.display_event_info(event_id)
-    elif choice == '4':
-        # Register Event
-        event_db.register_event()
-    elif choice == '5':
-        # View Event Capacity
-        event_db.view_event_capacity()
-    elif choice == '6':
-        # Customer Feedback
-        event_db.customer_feedback()
-    elif choice == '7':
-        # Customer Loyalty
-        event_db.customer_loyalty()
-    elif choice == '8':
-        # Generate Report
-        event_db.generate_report()
-    elif choice == '9':
-        # Exit
-        print("Exiting the Event Database. Goodbye!")
-        break
-    else:
-        print("Invalid choice. Please enter a number between 1 and 9.")
+def main(db_path=os.environ.get("EVENTS_DB")):
+    # With EVENTS_DB set, events are kept in that SQLite file and survive restarts.
+    store = EventStore(db_path) if db_path else None
+    event_db = EventDatabase(store=store)
+
+    try:
+        while True:
+            print("\nSelect an option:")
+            print("1. Create Event")
+            print("2. Modify Event")
+            print("3. Display Event Info")
+            print("4. Register Event")
+            print("5. View Event Capacity")
+            print("6. Customer Feedback")
+            print("7. Customer Loyalty")
+            print("8. Generate Report")
+            print("9. Export Reports")
+            print("10. Exit")
+
+            choice = input("Enter your choice (1-10): ")
+
+            if choice == '1':
+                # Create Event
+                event_db.create_event()
+            elif choice == '2':
+                # Modify Event
+                event_id = int(input("Enter Event ID to modify: "))
+                event_db.modify_event(event_id)
+            elif choice == '3':
+                # Display Event Info
+                event_id = int(input("Enter Event ID: "))
+                event_db.display_event_info(event_id)
+            elif choice == '4':
+                # Register Event
+                event_db.register_event()
+            elif choice == '5':
+                # View Event Capacity
+                event_db.view_event_capacity()
+            elif choice == '6':
+                # Customer Feedback
+                event_db.customer_feedback()
+            elif choice == '7':
+                # Customer Loyalty
+                event_db.customer_loyalty()
+            elif choice == '8':
+                # Generate Report
+                event_db.generate_report()
+            elif choice == '9':
+                # Export Reports
+                event_db.export_reports()
+            elif choice == '10':
+                # Exit
+                print("Exiting the Event Database. Goodbye!")
+                break
+            else:
+                print("Invalid choice. Please enter a number between 1 and 10.")
+    finally:
+        if store:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the EventDatabase in "7.Final event managment system.py".
+
+    python benchmarks.py register --clients 1000 --capacity 5000
+    python benchmarks.py startup --events 1000 10000 100000
+    python benchmarks.py reports --events 20000 --processes 1 4
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from event_store import EventStore
+from reports import generate_reports
+
+EVENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "7.Final event managment system.py")
+HOT_EVENT = 1
+
+
+def load_events():
+    """Import the event script; its file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location("final_event_management", EVENTS_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_register(event_db, event_id, attendee_name, seats):
+    """register_event as it was before register(): read the remaining capacity, then book in a separate step."""
+    if seats <= event_db.remaining_capacity(event_id):
+        time.sleep(0)  # a thread switch here is all it takes to overbook
+        event_db.book_seats(event_id, attendee_name, seats)
+
+
+def run_clients(module, args, register):
+    """Let args.clients threads register for one hot event at once; return attempts/s, seats booked and waitlist length."""
+    event_db = module.EventDatabase()
+    event_db.add_event(HOT_EVENT, "Hot event", capacity=args.capacity)
+    start = threading.Barrier(args.clients + 1)
+
+    def client(i):
+        rng = random.Random(i)
+        start.wait()
+        for _ in range(args.attempts):
+            register(event_db, HOT_EVENT, "client {}".format(i), rng.randint(1, args.max_seats))
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    began = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - began
+
+    event_info = event_db.events[HOT_EVENT]
+    # Counted from the booking records: the legacy path can also lose updates to seats_taken
+    booked = sum(seats for _, seats in event_info['bookings'])
+    return args.clients * args.attempts / seconds, booked, len(event_info['waitlist'])
+
+
+def bench_register(args):
+    """Concurrent registrations for one hot event: register(), the engine's thread pool, and the old check-then-book."""
+    module = load_events()
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(args.switch_interval)
+    results = []
+    try:
+        results.append(("register",) + run_clients(module, args, lambda event_db, event_id, name, seats:
+                                                   event_db.register(event_id, name, seats)))
+        engines = []
+
+        def through_engine(event_db, event_id, name, seats):
+            if not engines:
+                engines.append(module.RegistrationEngine(event_db, args.workers))
+            engines[0].submit(event_id, name, seats).result()
+
+        try:
+            results.append(("engine",) + run_clients(module, args, through_engine))
+        finally:
+            for engine in engines:
+                engine.close()
+        results.append(("legacy",) + run_clients(module, args, legacy_register))
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    failed = False
+    for name, rate, booked, waitlisted in results:
+        overbooked = max(0, booked - args.capacity)
+        print("{:8} {} clients: {:9.0f} registrations/s, {} of {} seats booked, {} waitlisted, overbooked {}".format(
+            name, args.clients, rate, booked, args.capacity, waitlisted, overbooked))
+        if name != "legacy" and overbooked:
+            failed = True
+    return 1 if failed else 0
+
+
+def fill_store(module, path, events, bookings):
+    """Store `events` events of `bookings` one-seat bookings each in a new database at path."""
+    store = EventStore(path, sync=False)
+    with store.transaction():
+        for event_id in range(events):
+            store.save_event(event_id, {'event_name': "Event {}".format(event_id), 'speaker_name': None,
+                                        'date': None, 'capacity': bookings * 2, 'bookings': module.SeatBookings(),
+                                        'feedback': {'event_rating': event_id % 10 + 1, 'additional_comment': None}})
+            for booking in range(bookings):
+                store.add_booking(event_id, "customer {}".format(booking), 1, module.LOYALTY_POINTS_PER_SEAT)
+    store.close()
+
+
+def bench_startup(args):
+    """Time opening an event store and reading one event as the number of stored events grows."""
+    module = load_events()
+    for count in args.events:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.sqlite3")
+            began = time.perf_counter()
+            fill_store(module, path, count, args.bookings)
+            fill_seconds = time.perf_counter() - began
+
+            began = time.perf_counter()
+            store = EventStore(path)
+            event_db = module.EventDatabase(store=store)
+            remaining = event_db.remaining_capacity(count // 2)
+            open_seconds = time.perf_counter() - began
+            store.close()
+        print("{:7} events, {} bookings each: stored in {:6.2f} s, opened and read one event in {:6.2f} ms "
+              "({} seats left)".format(count, args.bookings, fill_seconds, open_seconds * 1000, remaining))
+    return 0
+
+
+def bench_reports(args):
+    """Report on every stored event to CSV and JSON Lines, serially and with worker processes."""
+    module = load_events()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "events.sqlite3")
+        fill_store(module, path, args.events, args.bookings)
+        store = EventStore(path)
+        event_db = module.EventDatabase(store=store)
+        for extension in (".csv", ".jsonl"):
+            for processes in args.processes:
+                report_path = os.path.join(directory, "reports" + extension)
+                began = time.perf_counter()
+                written = generate_reports(event_db, report_path, processes=processes, chunk_size=args.chunk_size)
+                seconds = time.perf_counter() - began
+                print("{:6} {:2} processes: {} events in {:6.2f} s ({:7.0f} events/s, {:5.1f} MB)".format(
+                    extension, processes, written, seconds, written / seconds,
+                    os.path.getsize(report_path) / 1e6))
+        store.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    register_parser = commands.add_parser("register", help="concurrent registrations for one hot event")
+    register_parser.add_argument("--clients", type=int, default=1000, help="client threads registering at once")
+    register_parser.add_argument("--capacity", type=int, default=5000)
+    register_parser.add_argument("--attempts", type=int, default=20, help="registrations each client tries")
+    register_parser.add_argument("--max-seats", type=int, default=3, help="largest group a client books")
+    register_parser.add_argument("--workers", type=int, default=32, help="worker threads of the engine")
+    register_parser.add_argument("--switch-interval", type=float, default=1e-6,
+                                 help="sys.setswitchinterval() during the run; small values switch threads often")
+    register_parser.set_defaults(run=bench_register)
+
+    startup_parser = commands.add_parser("startup", help="opening an event store of growing size")
+    startup_parser.add_argument("--events", type=int, nargs="+", default=[1000, 10000, 100000])
+    startup_parser.add_argument("--bookings", type=int, default=10, help="bookings stored per event")
+    startup_parser.set_defaults(run=bench_startup)
+
+    reports_parser = commands.add_parser("reports", help="reports on every stored event")
+    reports_parser.add_argument("--events", type=int, default=20000)
+    reports_parser.add_argument("--bookings", type=int, default=20, help="bookings stored per event")
+    reports_parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    reports_parser.add_argument("--chunk-size", type=int, default=500)
+    reports_parser.set_defaults(run=bench_reports)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+SQLite storage for the EventDatabase in "7.Final event managment system.py".
+
+Every change to an event, its bookings, waitlist and feedback, and to the
+customer indexes is written through to the database before the call that
+made it returns.  Nothing is read up front: an event's row is loaded the
+first time the event is looked up, and its bookings the first time they are
+listed, so opening a store takes the same time however many events it holds.
+Remaining capacity needs only the row, which keeps seats_taken.
+
+    store = EventStore("events.sqlite3")
+    event_db = EventDatabase(store=store)
+    ...
+    store.close()
+
+Tables:
+
+    events           one row per event, with its feedback and seats_taken
+    bookings         (event_id, attendee, seats), in booking order
+    waitlist         (event_id, attendee, seats), in the order they joined
+    customer_events  (customer_name, event_id, seats)
+    loyalty          (customer_name, points)
+"""
+import collections
+import contextlib
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    event_id INTEGER PRIMARY KEY,
+    event_name TEXT,
+    speaker_name TEXT,
+    date TEXT,
+    time TEXT,
+    capacity INTEGER,
+    seats_taken INTEGER NOT NULL DEFAULT 0,
+    event_rating INTEGER,
+    additional_comment TEXT
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    event_id INTEGER NOT NULL,
+    attendee TEXT NOT NULL,
+    seats INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bookings_by_event ON bookings (event_id);
+CREATE TABLE IF NOT EXISTS waitlist (
+    event_id INTEGER NOT NULL,
+    attendee TEXT NOT NULL,
+    seats INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS waitlist_by_event ON waitlist (event_id);
+CREATE TABLE IF NOT EXISTS customer_events (
+    customer_name TEXT NOT NULL,
+    event_id INTEGER NOT NULL,
+    seats INTEGER NOT NULL,
+    PRIMARY KEY (customer_name, event_id)
+);
+CREATE TABLE IF NOT EXISTS loyalty (
+    customer_name TEXT PRIMARY KEY,
+    points INTEGER NOT NULL
+);
+"""
+
+_MISSING = object()
+
+
+class LazyMapping:
+    """
+    A dict that loads each missing key on first use and keeps it.
+
+    load(key) returns the stored value or raises KeyError; keys() lists every
+    stored key.  Assigning only updates the cache: writing to the database is
+    up to the caller.
+    """
+
+    def __init__(self, load, keys):
+        self._load = load
+        self._keys = keys
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            with self._lock:
+                value = self._cache.get(key, _MISSING)
+                if value is _MISSING:
+                    try:
+                        value = self._cache[key] = self._load(key)
+                    except KeyError:
+                        return default
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value):
+        self._cache[key] = value
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = self._cache[key] = default
+        return value
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def keys(self):
+        return self._keys()
+
+    def values(self):
+        return [self[key] for key in self._keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self._keys()]
+
+
+class EventStore:
+    """Keeps an EventDatabase's events and customer indexes in a SQLite database."""
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        # One connection shared by all threads; _lock serialises its use.
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous={}".format("FULL" if sync else "NORMAL"))
+        self._connection.executescript(SCHEMA)
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group writes into one transaction; nested transactions join the outermost one."""
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._connection.execute("COMMIT")
+
+    def _write(self, sql, parameters=()):
+        with self.transaction():
+            self._connection.execute(sql, parameters)
+
+    # Loading
+
+    def event_ids(self):
+        return [row[0] for row in self._query("SELECT event_id FROM events ORDER BY event_id")]
+
+    def load_event(self, event_id, make_bookings):
+        """
+        Read an event's row and waitlist into the dict EventDatabase keeps per event.
+
+        Parameters:
+        - event_id: Identifier of the event.
+        - make_bookings (callable): make_bookings(seats_taken, load) returns the event's
+          bookings object, which calls load() for its records when they are first needed.
+
+        Raises:
+        KeyError: If the event is not stored.
+        """
+        rows = self._query("SELECT event_name, speaker_name, date, time, capacity, seats_taken, event_rating, "
+                           "additional_comment FROM events WHERE event_id = ?", (event_id,))
+        if not rows:
+            raise KeyError(event_id)
+        event_name, speaker_name, date, time, capacity, seats_taken, event_rating, additional_comment = rows[0]
+        event_info = {
+            'event_name': event_name,
+            'speaker_name': speaker_name,
+            'date': date,
+            'capacity': capacity,
+            'bookings': make_bookings(seats_taken, lambda: self.load_bookings(event_id)),
+            'waitlist': collections.deque(self._query(
+                "SELECT attendee, seats FROM waitlist WHERE event_id = ? ORDER BY rowid", (event_id,))),
+            'feedback': {
+                'event_rating': event_rating,
+                'additional_comment': additional_comment
+            }
+        }
+        if time is not None:
+            event_info['time'] = time
+        return event_info
+
+    def event_summaries(self, event_ids):
+        """
+        Read what a report needs about some events, without keeping anything loaded.
+
+        Returns:
+        list: One (event_id, event_name, speaker_name, date, time, capacity, seats_taken,
+        event_rating, additional_comment, attendees, waitlisted_seats) tuple per stored event,
+        in the order of event_ids; attendees are listed once each, in order of first booking.
+        """
+        event_ids = list(event_ids)
+        marks = ", ".join("?" * len(event_ids))
+        rows = {row[0]: row for row in self._query(
+            "SELECT event_id, event_name, speaker_name, date, time, capacity, seats_taken, event_rating, "
+            "additional_comment FROM events WHERE event_id IN ({})".format(marks), event_ids)}
+        attendees = {event_id: {} for event_id in rows}
+        for event_id, attendee in self._query(
+                "SELECT event_id, attendee FROM bookings WHERE event_id IN ({}) ORDER BY rowid".format(marks), event_ids):
+            attendees[event_id][attendee] = None
+        waitlisted = dict(self._query(
+            "SELECT event_id, SUM(seats) FROM waitlist WHERE event_id IN ({}) GROUP BY event_id".format(marks),
+            event_ids))
+        return [rows[event_id] + (list(attendees[event_id]), waitlisted.get(event_id, 0))
+                for event_id in event_ids if event_id in rows]
+
+    def load_bookings(self, event_id):
+        return self._query("SELECT attendee, seats FROM bookings WHERE event_id = ? ORDER BY rowid", (event_id,))
+
+    def load_customer_events(self, customer_name):
+        rows = self._query("SELECT event_id, seats FROM customer_events WHERE customer_name = ? ORDER BY rowid",
+                           (customer_name,))
+        if not rows:
+            raise KeyError(customer_name)
+        return dict(rows)
+
+    def load_loyalty_points(self, customer_name):
+        rows = self._query("SELECT points FROM loyalty WHERE customer_name = ?", (customer_name,))
+        if not rows:
+            raise KeyError(customer_name)
+        return rows[0][0]
+
+    def customer_names(self):
+        return [row[0] for row in self._query("SELECT customer_name FROM loyalty ORDER BY rowid")]
+
+    # Writing
+
+    def save_event(self, event_id, event_info):
+        """Write an event's details, capacity and feedback; bookings and waitlist are written separately."""
+        feedback = event_info['feedback']
+        self._write("INSERT INTO events (event_id, event_name, speaker_name, date, time, capacity, seats_taken, "
+                    "event_rating, additional_comment) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (event_id) DO UPDATE SET event_name = excluded.event_name, "
+                    "speaker_name = excluded.speaker_name, date = excluded.date, time = excluded.time, "
+                    "capacity = excluded.capacity, event_rating = excluded.event_rating, "
+                    "additional_comment = excluded.additional_comment",
+                    (event_id, event_info['event_name'], event_info['speaker_name'], event_info['date'],
+                     event_info.get('time'), event_info['capacity'], event_info['bookings'].seats_taken,
+                     feedback['event_rating'], feedback['additional_comment']))
+
+    def add_booking(self, event_id, attendee, seats, points):
+        """Record a booking, the seats it takes, and the customer's seats and loyalty points, as one transaction."""
+        with self.transaction():
+            self._connection.execute("INSERT INTO bookings (event_id, attendee, seats) VALUES (?, ?, ?)",
+                                     (event_id, attendee, seats))
+            self._connection.execute("UPDATE events SET seats_taken = seats_taken + ? WHERE event_id = ?",
+                                     (seats, event_id))
+            self._connection.execute("INSERT INTO customer_events (customer_name, event_id, seats) VALUES (?, ?, ?) "
+                                     "ON CONFLICT (customer_name, event_id) DO UPDATE SET seats = seats + excluded.seats",
+                                     (attendee, event_id, seats))
+            self._connection.execute("INSERT INTO loyalty (customer_name, points) VALUES (?, ?) "
+                                     "ON CONFLICT (customer_name) DO UPDATE SET points = points + excluded.points",
+                                     (attendee, points))
+
+    def change_capacity(self, event_id, event_info, bookings):
+        """
+        Write a new capacity and the bookings it let in from the waitlist, as one transaction.
+
+        Parameters:
+        - event_id: Identifier of the event.
+        - event_info (dict): The event, with its new capacity and what is left of its waitlist.
+        - bookings (list): (attendee, seats, points) of each booking made from the waitlist.
+        """
+        with self.transaction():
+            self.save_event(event_id, event_info)
+            for attendee, seats, points in bookings:
+                self.add_booking(event_id, attendee, seats, points)
+            if bookings:
+                self.save_waitlist(event_id, event_info['waitlist'])
+
+    def add_to_waitlist(self, event_id, attendee, seats):
+        self._write("INSERT INTO waitlist (event_id, attendee, seats) VALUES (?, ?, ?)", (event_id, attendee, seats))
+
+    def save_waitlist(self, event_id, waitlist):
+        with self.transaction():
+            self._connection.execute("DELETE FROM waitlist WHERE event_id = ?", (event_id,))
+            self._connection.executemany("INSERT INTO waitlist (event_id, attendee, seats) VALUES (?, ?, ?)",
+                                         [(event_id, attendee, seats) for attendee, seats in waitlist])
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Event reports for the EventDatabase in "7.Final event managment system.py".
+
+generate_reports() writes one report row per event to a CSV or JSON Lines
+file, chosen by the file's extension.  Rows are written as they are made,
+chunk by chunk, so only a few chunks of events are held in memory at a time.
+
+    generate_reports(event_db, "reports.csv")                     # every event
+    generate_reports(event_db, "reports.jsonl", event_ids=[1, 2])
+    generate_reports(event_db, "rated.csv", where=lambda row: row['event_rating'] is not None)
+    generate_reports(event_db, "reports.jsonl", processes=8)      # events kept in an EventStore
+
+With an EventStore, the events are read from its database without being
+cached in the EventDatabase, and with processes > 1 the chunks are read and
+built by a pool of worker processes, each with its own connection.  Events
+held only in memory are reported from the parent process.
+"""
+import collections
+import concurrent.futures
+import csv
+import json
+import os
+
+from event_store import EventStore
+
+REPORT_FIELDS = ('event_id', 'event_name', 'speaker_name', 'date', 'time', 'capacity', 'seats_taken',
+                 'remaining_capacity', 'attendees', 'waitlisted_seats', 'event_rating', 'additional_comment')
+
+_worker_stores = {}  # database path -> EventStore of this worker process
+
+
+def report_row(event_id, event_name, speaker_name, date, time, capacity, seats_taken, event_rating,
+               additional_comment, attendees, waitlisted_seats):
+    return {
+        'event_id': event_id,
+        'event_name': event_name,
+        'speaker_name': speaker_name,
+        'date': date,
+        'time': time,
+        'capacity': capacity,
+        'seats_taken': seats_taken,
+        'remaining_capacity': capacity - seats_taken if capacity is not None else None,
+        'attendees': attendees,
+        'waitlisted_seats': waitlisted_seats,
+        'event_rating': event_rating,
+        'additional_comment': additional_comment,
+    }
+
+
+def event_report(event_id, event_info):
+    """
+    Build the report row of an event held in memory.
+
+    Parameters:
+    - event_id: Identifier of the event.
+    - event_info (dict): The event, as kept in EventDatabase.events; the caller holds its lock.
+
+    Returns:
+    dict: The event's report row, with the fields in REPORT_FIELDS.
+    """
+    feedback = event_info['feedback']
+    return report_row(event_id, event_info['event_name'], event_info['speaker_name'], event_info['date'],
+                      event_info.get('time'), event_info['capacity'], event_info['bookings'].seats_taken,
+                      feedback['event_rating'], feedback['additional_comment'], event_info['bookings'].attendees(),
+                      sum(seats for _, seats in event_info['waitlist']))
+
+
+def _stored_reports(path, event_ids):
+    """Build the report rows of a chunk of stored events; runs in a worker process."""
+    store = _worker_stores.get(path)
+    if store is None:
+        store = _worker_stores[path] = EventStore(path)
+    return [report_row(*summary) for summary in store.event_summaries(event_ids)]
+
+
+def _chunks(event_ids, chunk_size):
+    chunk = []
+    for event_id in event_ids:
+        chunk.append(event_id)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _report_chunks(event_db, event_ids, processes, chunk_size):
+    store = event_db.store
+    if store is None:
+        for chunk in _chunks(event_ids, chunk_size):
+            rows = (event_db.report_row(event_id) for event_id in chunk)
+            yield [row for row in rows if row is not None]
+    elif processes > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+            # Chunks are handed out a couple per worker ahead, and written back in order.
+            pending = collections.deque()
+            for chunk in _chunks(event_ids, chunk_size):
+                pending.append(pool.submit(_stored_reports, store.path, chunk))
+                if len(pending) > processes * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    else:
+        for chunk in _chunks(event_ids, chunk_size):
+            yield [report_row(*summary) for summary in store.event_summaries(chunk)]
+
+
+class _CsvWriter:
+    def __init__(self, file):
+        self._writer = csv.DictWriter(file, REPORT_FIELDS)
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(dict(row, attendees='; '.join(row['attendees'])))
+
+
+class _JsonLinesWriter:
+    def __init__(self, file):
+        self._file = file
+
+    def write(self, row):
+        self._file.write(json.dumps(row))
+        self._file.write('\n')
+
+
+WRITERS = {'.csv': _CsvWriter, '.jsonl': _JsonLinesWriter}
+
+
+def generate_reports(event_db, path, event_ids=None, where=None, processes=1, chunk_size=500):
+    """
+    Write a report row for each of a set of events to a CSV or JSON Lines file.
+
+    Parameters:
+    - event_db (EventDatabase): The events to report on.
+    - path (str): File to write; a .csv extension writes CSV and .jsonl writes JSON Lines.
+    - event_ids: (Optional) The events to report on, in order; every event if omitted.
+    - where: (Optional) where(row) is called with each report row, and only rows it returns true for are written.
+    - processes (int): Worker processes building the rows of events kept in an EventStore.
+    - chunk_size (int): Events read and built together.
+
+    Returns:
+    int: The number of rows written.
+
+    Raises:
+    ValueError: If the file extension is neither .csv nor .jsonl.
+    """
+    writer_class = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer_class is None:
+        raise ValueError(f"Reports are written as {' or '.join(WRITERS)} files, not '{path}'.")
+    if event_ids is None:
+        event_ids = list(event_db.events)
+
+    written = 0
+    with open(path, 'w', newline='') as file:
+        writer = writer_class(file)
+        for rows in _report_chunks(event_db, event_ids, processes, chunk_size):
+            for row in rows:
+                if where is None or where(row):
+                    writer.write(row)
+                    written += 1
+    return written
@@ -0,0 +1,80 @@
+import importlib.util
+import os
+import threading
+import time
+
+import pytest
+
+from event_store import EventStore
+
+EVENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "7.Final event managment system.py")
+EVENTS = 8
+CUSTOMERS = 20
+REGISTRATIONS = 200  # by each of 8 threads
+
+
+@pytest.fixture(scope="module")
+def events_module():
+    spec = importlib.util.spec_from_file_location("final_event_management", EVENTS_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_threads(targets, timeout=30):
+    threads = [threading.Thread(target=target, daemon=True) for target in targets]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+    # A thread still running after the timeout is stuck on a lock.
+    assert not any(thread.is_alive() for thread in threads), "deadlock"
+
+
+def test_registrations_while_capacity_grows(tmp_path, events_module, capsys):
+    path = str(tmp_path / "events.sqlite3")
+    store = EventStore(path, sync=False)
+    event_db = events_module.EventDatabase(store=store)
+    for event_id in range(EVENTS):
+        event_db.add_event(event_id, "Event {}".format(event_id), capacity=0)
+        for customer in range(CUSTOMERS):
+            event_db.register(event_id, "Customer {}".format(customer), 1)
+
+    # A new EventDatabase on the same store starts with nothing loaded, so customer
+    # and event lookups go to the store while set_capacity holds its transaction.
+    event_db = events_module.EventDatabase(store=store)
+    registered = []  # event ID of each registration the threads made
+
+    def register(worker):
+        def run():
+            for n in range(REGISTRATIONS):
+                event_id = (worker + n) % EVENTS
+                # New customers, so that their first booking looks them up in the store.
+                event_db.register(event_id, "Customer {}-{}".format(worker, n), 1)
+                registered.append(event_id)
+        return run
+
+    def grow_capacity():
+        for capacity in range(1, 21):
+            for event_id in range(EVENTS):
+                event_db.set_capacity(event_id, capacity * 20)
+
+    run_threads([register(worker) for worker in range(8)] + [grow_capacity])
+    assert len(registered) == 8 * REGISTRATIONS
+    store.close()
+    capsys.readouterr()
+
+    # Every seat booked in memory was stored, and nobody was both booked and left waiting for the same seat.
+    store = EventStore(path, sync=False)
+    reloaded = events_module.EventDatabase(store=store)
+    total_seats = 0
+    for event_id in range(EVENTS):
+        event_info = reloaded.events[event_id]
+        booked = sum(seats for _, seats in event_info['bookings'])
+        assert booked == event_info['bookings'].seats_taken <= event_info['capacity']
+        assert booked + sum(seats for _, seats in event_info['waitlist']) == CUSTOMERS + registered.count(event_id)
+        total_seats += booked
+    points = sum(reloaded.loyalty_points[name] for name in reloaded.loyalty_points)
+    assert points == total_seats * events_module.LOYALTY_POINTS_PER_SEAT
+    store.close()
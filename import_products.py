@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+from db import get_pool
+from migrations import migrate
+
+# The database configuration
+DATABASE = os.environ.get("FLASK_DATABASE", "app.db")
+
+# Columns of the products table, in table order, with the type each value is converted to.
+PRODUCT_COLUMNS = (
+    ("product_id", int),
+    ("supplier_id", int),
+    ("quantity", int),
+    ("short_description", str),
+    ("long_description", str),
+    ("minimum_age", int),
+    ("input_unit_price", float),
+    ("shopper_unit_price", float),
+)
+CHUNK_SIZE = 5000
+IN_QUERY_SIZE = 900  # stay below SQLite's default limit of 999 bound parameters
+MAX_REPORTED_REJECTS = 1000
+
+
+# Readers yield a string instead of a record for a line they cannot read; it is the reason the line is rejected.
+
+def is_utf8(text):
+    """False if text holds bytes that were not valid UTF-8, decoded as surrogates by text_stream()."""
+    try:
+        text.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def read_csv(stream):
+    """Yield (line number, record) pairs from a CSV stream with a header row."""
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.line_num, "invalid CSV: {}".format(e)
+            continue
+        fields = [key or "" for key in record] + [
+            value if isinstance(value, str) else "".join(value or ()) for value in record.values()]
+        if is_utf8("".join(fields)):
+            yield reader.line_num, record
+        else:
+            yield reader.line_num, "invalid UTF-8"
+
+
+def read_jsonl(stream):
+    """Yield (line number, record) pairs from a JSON Lines stream; blank lines are skipped."""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if not is_utf8(line):
+            yield line_no, "invalid UTF-8"
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, "invalid JSON: {}".format(e)
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def text_stream(raw):
+    """
+    Decode a binary upload stream as UTF-8 text for the READERS.
+
+    Invalid bytes are decoded as surrogates rather than raising, so that the
+    READERS reject only the lines that hold them.
+    """
+    # Before Python 3.11 SpooledTemporaryFile, which Werkzeug spools uploads to,
+    # has no readable() and TextIOWrapper refuses it; wrap the file it holds instead.
+    if isinstance(raw, tempfile.SpooledTemporaryFile):
+        raw = raw._file
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="surrogateescape", newline="")
+
+
+def format_for(filename):
+    """Guess the input format from a file name, defaulting to CSV."""
+    if filename and filename.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def convert(record):
+    """Convert one input record into a products row, raising ValueError if it is invalid."""
+    if not isinstance(record, dict):
+        raise ValueError(record if isinstance(record, str) else "record is not an object")
+    row = []
+    for column, kind in PRODUCT_COLUMNS:
+        value = record.get(column)
+        if value is None or value == "":
+            raise ValueError("missing {}".format(column))
+        try:
+            row.append(kind(value))
+        except (TypeError, ValueError):
+            raise ValueError("{} is not a valid {}: {!r}".format(column, kind.__name__, value))
+    if row[2] < 0:
+        raise ValueError("quantity must not be negative")
+    return tuple(row)
+
+
+def existing_ids_query(count):
+    """The SQL validate_batch() finds which of `count` product IDs are taken with."""
+    return "SELECT product_id FROM products WHERE product_id IN ({})".format(",".join("?" * count))
+
+
+def validate_batch(conn, records):
+    """
+    Validate a batch of (line number, record) pairs.
+
+    Returns the rows to insert, a list of (line number, reason) for the
+    rejected ones, and how many of those could not be read at all.  Product IDs that repeat within the batch or already exist
+    in the table are looked up with a few IN queries for the whole batch.
+    """
+    rows = []
+    line_numbers = []
+    rejected = []
+    malformed = 0
+    seen = set()
+    for line_no, record in records:
+        malformed += isinstance(record, str)
+        try:
+            row = convert(record)
+        except ValueError as e:
+            rejected.append((line_no, str(e)))
+            continue
+        if row[0] in seen:
+            rejected.append((line_no, "duplicate product_id {} in input".format(row[0])))
+            continue
+        seen.add(row[0])
+        rows.append(row)
+        line_numbers.append(line_no)
+
+    existing = set()
+    for start in range(0, len(rows), IN_QUERY_SIZE):
+        ids = [row[0] for row in rows[start:start + IN_QUERY_SIZE]]
+        existing.update(r[0] for r in conn.execute(
+            existing_ids_query(len(ids)), ids))
+    if existing:
+        kept = []
+        for line_no, row in zip(line_numbers, rows):
+            if row[0] in existing:
+                rejected.append((line_no, "product_id {} already exists".format(row[0])))
+            else:
+                kept.append(row)
+        rows = kept
+        rejected.sort()
+    return rows, rejected, malformed
+
+
+def import_products(conn, records, chunk_size=CHUNK_SIZE):
+    """
+    Insert products from an iterable of (line number, record) pairs.
+
+    The input is consumed `chunk_size` records at a time; every chunk is
+    validated together and written with executemany() in its own transaction.
+    Returns a report with the inserted and rejected counts and the throughput;
+    `malformed` counts the rejected lines that could not be decoded or parsed.
+    """
+    started = time.perf_counter()
+    inserted = 0
+    rejected_count = 0
+    malformed_count = 0
+    rejected_rows = []
+    placeholders = ",".join("?" * len(PRODUCT_COLUMNS))
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        with conn:
+            rows, rejected, malformed = validate_batch(conn, chunk)
+            conn.executemany("INSERT INTO products VALUES ({})".format(placeholders), rows)
+        inserted += len(rows)
+        rejected_count += len(rejected)
+        malformed_count += malformed
+        rejected_rows.extend(rejected[:MAX_REPORTED_REJECTS - len(rejected_rows)])
+
+    seconds = time.perf_counter() - started
+    return {
+        "inserted": inserted,
+        "rejected": rejected_count,
+        "malformed": malformed_count,
+        "rejected_rows": [{"line": line_no, "reason": reason} for line_no, reason in rejected_rows],
+        "seconds": round(seconds, 3),
+        "rows_per_second": round((inserted + rejected_count) / seconds) if seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import products from CSV or JSON Lines.")
+    parser.add_argument("file", help="input file, or - for standard input")
+    parser.add_argument("--format", choices=sorted(READERS), help="input format (default: from file name)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per transaction")
+    args = parser.parse_args()
+
+    fmt = args.format or format_for(args.file)
+    if args.file == "-":
+        stream = text_stream(sys.stdin.buffer)
+    else:
+        stream = text_stream(open(args.file, "rb"))
+    with stream, get_pool(DATABASE).connection() as con:
+        migrate(con)
+        report = import_products(con, READERS[fmt](stream), args.chunk_size)
+
+    print("Inserted {inserted} products, rejected {rejected} in {seconds}s ({rows_per_second} rows/s).".format(**report))
+    for reject in report["rejected_rows"]:
+        print("line {line}: {reason}".format(**reject), file=sys.stderr)
+    return 1 if report["rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,76 @@
+import bisect
+
+
 class ECommercePlatform:
     def __init__(self):
         # Initialize dictionaries to store customer profiles and product information
         self.customer_profiles = {}
         self.inventory = {}
 
+        # Secondary indexes over customer names, kept in step with customer_profiles.
+        # Names map to the IDs that use them, in the order the profiles were added.
+        self.customer_ids_by_name = {}
+        self.customer_ids_by_folded_name = {}
+        # (folded name, customer ID) pairs for prefix search.  New pairs are appended and the
+        # list is only sorted again by the next search or removal (see _sorted_folded_names).
+        self.sorted_folded_names = []
+        self.folded_names_sorted = True
+
+        # Inverted index from product to the customers who ordered it.
+        # product_buyers lists buyers in the order of their first order of the product;
+        # product_orders holds, per buyer, the positions of those orders in order_history.
+        self.product_buyers = {}
+        self.product_orders = {}
+
+    def _index_customer(self, customer_id, customer_name):
+        folded = customer_name.casefold()
+        self.customer_ids_by_name.setdefault(customer_name, {})[customer_id] = None
+        self.customer_ids_by_folded_name.setdefault(folded, {})[customer_id] = None
+        # Appending keeps bulk loads linear; bisect.insort here made them quadratic.
+        self.sorted_folded_names.append((folded, customer_id))
+        self.folded_names_sorted = False
+
+    def _unindex_customer(self, customer_id, customer_name):
+        folded = customer_name.casefold()
+        for index, key in ((self.customer_ids_by_name, customer_name), (self.customer_ids_by_folded_name, folded)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(customer_id, None)
+                if not ids:
+                    del index[key]
+        names = self._sorted_folded_names()
+        position = bisect.bisect_left(names, (folded, customer_id))
+        if position < len(names) and names[position] == (folded, customer_id):
+            del names[position]
+
+    def _sorted_folded_names(self):
+        # A sorted list with a tail of new pairs sorts in about the time of sorting the
+        # tail and merging it, so a search after a bulk load of n profiles costs O(n log n) once.
+        if not self.folded_names_sorted:
+            self.sorted_folded_names.sort()
+            self.folded_names_sorted = True
+        return self.sorted_folded_names
+
+    def _record_order(self, customer_id, product_id, order):
+        order_history = self.customer_profiles[customer_id].setdefault('order_history', [])
+        order_history.append(order)
+        orders = self.product_orders.setdefault(product_id, {})
+        if customer_id not in orders:
+            orders[customer_id] = []
+            self.product_buyers.setdefault(product_id, []).append(customer_id)
+        orders[customer_id].append(len(order_history) - 1)
+
+    def _forget_orders(self, customer_id):
+        for order in self.customer_profiles[customer_id].get('order_history', []):
+            product_id = order['product_id']
+            orders = self.product_orders.get(product_id)
+            if orders is None or orders.pop(customer_id, None) is None:
+                continue
+            self.product_buyers[product_id].remove(customer_id)
+            if not orders:
+                del self.product_orders[product_id]
+                del self.product_buyers[product_id]
+
     def add_customer_profile(self, customer_id, customer_name):
         """
         Add a customer profile to the e-commerce platform.
@@ -15,7 +82,47 @@ class ECommercePlatform:
         Returns:
         None
         """
+        if customer_id in self.customer_profiles:
+            self._forget_orders(customer_id)
+            self._unindex_customer(customer_id, self.customer_profiles[customer_id]['customer_name'])
         self.customer_profiles[customer_id] = {'customer_name': customer_name, 'cart': {}, 'order_history': []}
+        self._index_customer(customer_id, customer_name)
+
+    def update_customer_name(self, customer_id, customer_name):
+        """
+        Change the name on an existing customer profile.
+
+        Parameters:
+        - customer_id (int): Unique identifier for the customer.
+        - customer_name (str): New name of the customer.
+
+        Returns:
+        bool: True if the profile was found and updated, False otherwise.
+        """
+        if customer_id not in self.customer_profiles:
+            return False
+        profile = self.customer_profiles[customer_id]
+        self._unindex_customer(customer_id, profile['customer_name'])
+        profile['customer_name'] = customer_name
+        self._index_customer(customer_id, customer_name)
+        return True
+
+    def delete_customer_profile(self, customer_id):
+        """
+        Delete a customer profile from the e-commerce platform.
+
+        Parameters:
+        - customer_id (int): Unique identifier for the customer.
+
+        Returns:
+        bool: True if the profile was found and deleted, False otherwise.
+        """
+        if customer_id not in self.customer_profiles:
+            return False
+        self._forget_orders(customer_id)
+        profile = self.customer_profiles.pop(customer_id)
+        self._unindex_customer(customer_id, profile['customer_name'])
+        return True
 
     def add_product_name(self, product_id, name):
         """
@@ -88,9 +195,7 @@ class ECommercePlatform:
             print("Product added to inventory successfully.")
 
             # Update customer's order history
-            order_history = self.customer_profiles[customer_id].get('order_history', [])
-            order_history.append({'product_id': product_id, 'product_name': name, 'quantity': quantity})
-            self.customer_profiles[customer_id]['order_history'] = order_history
+            self._record_order(customer_id, product_id, {'product_id': product_id, 'product_name': name, 'quantity': quantity})
 
         else:
             print("Customer not found. Please reenter the registered customer name or ID.")
@@ -140,9 +245,9 @@ class ECommercePlatform:
                     # Update customer's order history
                     customer_id = self.get_customer_id_by_product(product_id)
                     if customer_id != -1:
-                        order_history = self.customer_profiles[customer_id].get('order_history', [])
-                        order_history.append({'product_id': product_id, 'product_name': self.inventory[product_id]['name'], 'quantity': deletion_quantity})
-                        self.customer_profiles[customer_id]['order_history'] = order_history
+                        self._record_order(customer_id, product_id, {'product_id': product_id,
+                                                                     'product_name': self.inventory[product_id]['name'],
+                                                                     'quantity': deletion_quantity})
 
                 else:
                     print(f"Couldn't delete. The current product has only {current_quantity} items.")
@@ -176,27 +281,54 @@ class ECommercePlatform:
         else:
             return 0  # Product not found, quantity is 0
 
-    def get_customer_id(self, customer_input):
+    def get_customer_id(self, customer_input, ignore_case=False):
         """
         Get the customer ID based on the input (either customer name or ID).
+        If several customers share the name, the one added first is returned.
 
         Parameters:
         - customer_input (str or int): Customer name or ID.
+        - ignore_case (bool): Match the name case-insensitively.
 
         Returns:
         int: Customer ID if found, -1 otherwise.
         """
         if isinstance(customer_input, int):
             return customer_input
+        if ignore_case:
+            ids = self.customer_ids_by_folded_name.get(customer_input.casefold())
         else:
-            for cid, profile in self.customer_profiles.items():
-                if profile['customer_name'] == customer_input:
-                    return cid
-            return -1
+            ids = self.customer_ids_by_name.get(customer_input)
+        if ids:
+            return next(iter(ids))
+        return -1
+
+    def find_customers_by_prefix(self, prefix, limit=None):
+        """
+        Find customers whose name starts with a prefix, ignoring case.
+
+        Parameters:
+        - prefix (str): Start of the customer name.
+        - limit (int): Maximum number of results, or None for all.
+
+        Returns:
+        list: (customer ID, customer name) pairs in name order.
+        """
+        folded = prefix.casefold()
+        matches = []
+        names = self._sorted_folded_names()
+        position = bisect.bisect_left(names, (folded,))
+        while position < len(names) and (limit is None or len(matches) < limit):
+            name, cid = names[position]
+            if not name.startswith(folded):
+                break
+            matches.append((cid, self.customer_profiles[cid]['customer_name']))
+            position += 1
+        return matches
 
     def get_customer_id_by_product(self, product_id):
         """
-        Get the customer ID associated with a product.
+        Get the customer ID associated with a product: the first customer who ordered it.
 
         Parameters:
         - product_id (int): Unique identifier for the product.
@@ -204,13 +336,31 @@ class ECommercePlatform:
         Returns:
         int: Customer ID if found, -1 otherwise.
         """
-        for cid, profile in self.customer_profiles.items():
-            order_history = profile.get('order_history', [])
-            for order in order_history:
-                if order['product_id'] == product_id:
-                    return cid
+        buyers = self.product_buyers.get(product_id)
+        if buyers:
+            return buyers[0]
         return -1
 
+    def get_buyers_of_product(self, product_id, offset=0, limit=None):
+        """
+        Get the customers who ordered a product, one page at a time.
+
+        Parameters:
+        - product_id (int): Unique identifier for the product.
+        - offset (int): Number of buyers to skip.
+        - limit (int): Maximum number of buyers to return, or None for all.
+
+        Returns:
+        tuple: A list of (customer ID, positions of the customer's orders of the product
+        in their order_history) pairs, in the order the customers first ordered it,
+        and the offset of the next page (None if this is the last page).
+        """
+        buyers = self.product_buyers.get(product_id, [])
+        end = len(buyers) if limit is None else min(len(buyers), offset + limit)
+        orders = self.product_orders.get(product_id, {})
+        page = [(cid, list(orders[cid])) for cid in buyers[offset:end]]
+        return page, (end if end < len(buyers) else None)
+
     def check_order_history(self, customer_input):
         """
         Check the order history of a customer by customer name or ID.
@@ -230,11 +380,8 @@ class ECommercePlatform:
                 customer_id = customer_input
         else:
             # Check if the input is a customer name
-            for cid, profile in self.customer_profiles.items():
-                if profile['customer_name'] == customer_input:
-                    found_customer = True
-                    customer_id = cid
-                    break
+            customer_id = self.get_customer_id(customer_input)
+            found_customer = customer_id != -1
 
         if found_customer:
             order_history = self.customer_profiles[customer_id].get('order_history', [])
@@ -266,11 +413,8 @@ class ECommercePlatform:
                 customer_id = customer_input
         else:
             # Check if the input is a customer name
-            for cid, profile in self.customer_profiles.items():
-                if profile['customer_name'] == customer_input:
-                    found_customer = True
-                    customer_id = cid
-                    break
+            customer_id = self.get_customer_id(customer_input)
+            found_customer = customer_id != -1
 
         if found_customer:
             order_history = self.customer_profiles[customer_id].get('order_history', [])
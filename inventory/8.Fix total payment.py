@@ -1,9 +1,313 @@
-class ECommercePlatform:
+import bisect
+import contextlib
+import functools
+import heapq
+import os
+import threading
+import time
+from collections import namedtuple
+
+from columnar import StringTable
+from order_log import OrderLog
+
+# Number of locks the products' stock is spread over
+LOCK_STRIPES = 64
+
+# Results returned by ECommercePlatform
+ProductTotal = namedtuple('ProductTotal', 'product_id product_name total')
+PaymentSummary = namedtuple('PaymentSummary', 'customer_name total products')  # products: ProductTotals
+Deletion = namedtuple('Deletion', 'product_id deleted_quantity remaining_quantity removed')
+BatchResult = namedtuple('BatchResult', 'accepted orders errors')  # errors: LineErrors
+LineError = namedtuple('LineError', 'line customer_name product_id error')  # error: a PlatformError
+
+
+class PlatformError(Exception):
+    """A request the platform cannot carry out; the message is meant for the user."""
+
+
+class CustomerNotFound(PlatformError):
+    def __init__(self, customer_name):
+        super().__init__(f"Customer with name '{customer_name}' not found. Please reenter the registered name.")
+        self.customer_name = customer_name
+
+
+class ProductNotFound(PlatformError):
+    def __init__(self, product_id):
+        super().__init__(f"Product ID {product_id} not found in inventory.")
+        self.product_id = product_id
+
+
+class InsufficientStock(PlatformError):
+    def __init__(self, product_id, requested, available):
+        super().__init__(f"Insufficient quantity in the inventory. Product {product_id} has only {available} items.")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+class InvalidQuantity(PlatformError):
+    def __init__(self, quantity):
+        super().__init__(f"Quantity must be a positive whole number, not {quantity!r}.")
+        self.quantity = quantity
+
+
+class EmptyBatch(PlatformError):
     def __init__(self):
-        # Initialize dictionaries to store customer profiles and product information
+        super().__init__("The batch has no order lines.")
+
+
+def logged(method):
+    """
+    Mark a mutating method: record each call in the platform's store (see wal.py), if it has
+    one, and then run the low-stock callbacks the call triggered, outside of any lock.
+
+    The time of the call is fixed when it starts and logged with it, so that orders
+    replayed from the log get the times they were placed at.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        store = self.store
+        clock = self._call_time.__dict__
+        outermost = 'at' not in clock
+        if outermost:
+            clock['at'] = time.time()
+        try:
+            if store is None:
+                result = method(self, *args, **kwargs)
+            else:
+                # Apply and queue under the store's lock so the log has the calls in the order they ran.
+                with store.lock:
+                    result = method(self, *args, **kwargs)
+                    seq = store.enqueue(method.__name__, args, kwargs, clock['at'])
+                store.wait(seq)
+        finally:
+            if outermost:
+                del clock['at']
+            alerts = self._stock_alerts.__dict__.pop('pending', None)
+        for callback, product_id, quantity, threshold in alerts or ():
+            callback(product_id, quantity, threshold)
+        return result
+    return wrapper
+
+
+class ECommercePlatform:
+    # Attributes that are rebuilt by __init__ instead of being saved in snapshots
+    TRANSIENT_ATTRIBUTES = ('store', '_stock_locks', '_orders_lock', '_index_lock', 'stock_callbacks', '_stock_alerts',
+                            '_call_time')
+
+    def __init__(self, inventory=None):
+        # Initialize dictionaries to store customer profiles and product information.
+        # inventory may be any mapping with the same interface, e.g. columnar.ColumnarInventory.
         self.customer_profiles = {}
-        self.inventory = {}
+        self.inventory = {} if inventory is None else inventory
+        self.store = None  # set by wal.PlatformStore.open()
+        self._call_time = threading.local()  # time of this thread's current call; see logged()
+
+        # Product names of all order histories (see order_log.py), each stored once
+        self.order_names = StringTable()
+
+        # A product's stock is read and changed under its stripe lock.  Customer carts,
+        # order histories, payment totals and reservations are changed under _orders_lock,
+        # which is always taken after any stripe lock.
+        self._stock_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._orders_lock = threading.Lock()
+        # reservation ID -> (product ID, quantity) of stock held by reserve_stock
+        self.reservations = {}
+        self.next_reservation_id = 1
+
+        # Products by quantity, for the low-stock queries: the distinct quantities in stock,
+        # sorted, and quantity -> set of product IDs.  _index_lock is taken last, after any
+        # stripe lock and _orders_lock.
+        self.stock_levels = []
+        self.stock_buckets = {}
+        self._index_lock = threading.Lock()
+        # (threshold, callback) pairs; see add_low_stock_callback
+        self.stock_callbacks = []
+        # Callbacks due to run at the end of this thread's current call
+        self._stock_alerts = threading.local()
+
+        # Running bill of each customer, kept up to date as orders are placed and prices change:
+        # customer name -> {'total', 'subtotals': {product ID: latest quantity * price},
+        # 'quantities': {product ID: latest quantity}, 'lines': number of orders}
+        self.payment_totals = {}
+        # product ID -> names of the customers whose bill includes the product
+        self.product_customers = {}
+
+    def replay(self, method, args, kwargs, at):
+        """Call a logged method as if it were called at time `at`; used by wal.PlatformStore."""
+        self._call_time.at = at
+        try:
+            return getattr(self, method)(*args, **kwargs)
+        finally:
+            del self._call_time.at
+
+    def _now(self):
+        return getattr(self._call_time, 'at', None) or time.time()
+
+    def _stock_lock(self, product_id):
+        return self._stock_locks[hash(product_id) % LOCK_STRIPES]
+
+    @contextlib.contextmanager
+    def _all_stock_locks(self):
+        # Needed when rows of the inventory can move, e.g. a columnar inventory deleting a product.
+        with contextlib.ExitStack() as stack:
+            for lock in self._stock_locks:
+                stack.enter_context(lock)
+            yield
+
+    @contextlib.contextmanager
+    def _stock_locks_for(self, product_ids):
+        # Stripes are always taken in index order, so two batches cannot deadlock.
+        with contextlib.ExitStack() as stack:
+            for stripe in sorted({hash(product_id) % LOCK_STRIPES for product_id in product_ids}):
+                stack.enter_context(self._stock_locks[stripe])
+            yield
+
+    def _update_stock_index(self, product_id, old_quantity, new_quantity):
+        # A quantity of None means the product is not (or no longer) in the inventory.
+        with self._index_lock:
+            if old_quantity is not None:
+                bucket = self.stock_buckets[old_quantity]
+                bucket.discard(product_id)
+                if not bucket:
+                    del self.stock_buckets[old_quantity]
+                    del self.stock_levels[bisect.bisect_left(self.stock_levels, old_quantity)]
+            if new_quantity is not None:
+                bucket = self.stock_buckets.get(new_quantity)
+                if bucket is None:
+                    bucket = self.stock_buckets[new_quantity] = set()
+                    bisect.insort(self.stock_levels, new_quantity)
+                bucket.add(product_id)
+        if old_quantity is None or new_quantity is None:
+            return
+        for threshold, callback in self.stock_callbacks:
+            if new_quantity <= threshold < old_quantity:
+                self._stock_alerts.__dict__.setdefault('pending', []).append(
+                    (callback, product_id, new_quantity, threshold))
+
+    def _set_stock(self, product_id, quantity):
+        product = self.inventory[product_id]
+        old_quantity = product['quantity']
+        product['quantity'] = quantity
+        self._update_stock_index(product_id, old_quantity, quantity)
+
+    def _put_product(self, product_id, product):
+        old = self.inventory.get(product_id)
+        old_quantity = None if old is None else old['quantity']
+        self.inventory[product_id] = product
+        self._update_stock_index(product_id, old_quantity, product['quantity'])
+
+    def _reserve(self, product_id, quantity):
+        with self._stock_lock(product_id):
+            product = self.inventory.get(product_id)
+            if product is None or product['quantity'] < quantity:
+                return None
+            self._set_stock(product_id, product['quantity'] - quantity)
+            with self._orders_lock:
+                reservation_id = self.next_reservation_id
+                self.next_reservation_id += 1
+                self.reservations[reservation_id] = (product_id, quantity)
+        return reservation_id
+
+    def _commit(self, reservation_id):
+        with self._orders_lock:
+            return self.reservations.pop(reservation_id, None) is not None
+
+    def _release(self, reservation_id):
+        with self._orders_lock:
+            reservation = self.reservations.get(reservation_id)
+        if reservation is None:
+            return False
+        product_id, quantity = reservation
+        with self._stock_lock(product_id):
+            with self._orders_lock:
+                if self.reservations.pop(reservation_id, None) is None:
+                    return False  # committed or released meanwhile
+            if product_id in self.inventory:
+                self._set_stock(product_id, self.inventory[product_id]['quantity'] + quantity)
+        return True
+
+    @logged
+    def reserve_stock(self, product_id, quantity):
+        """
+        Take stock of a product out of the inventory and hold it until it is committed or released.
+
+        Parameters:
+        - product_id (int): Unique identifier for the product.
+        - quantity (int): Quantity to reserve.
+
+        Returns:
+        int: Reservation ID, or None if the product is not found or has too little stock.
+        """
+        return self._reserve(product_id, quantity)
+
+    @logged
+    def commit_reservation(self, reservation_id):
+        """
+        Make a reservation final: its stock stays out of the inventory.
+
+        Parameters:
+        - reservation_id (int): ID returned by reserve_stock.
+
+        Returns:
+        bool: True if the reservation was pending, False otherwise.
+        """
+        return self._commit(reservation_id)
 
+    @logged
+    def release_reservation(self, reservation_id):
+        """
+        Cancel a reservation and put its stock back in the inventory.
+
+        Parameters:
+        - reservation_id (int): ID returned by reserve_stock.
+
+        Returns:
+        bool: True if the reservation was pending, False otherwise.
+        """
+        return self._release(reservation_id)
+
+    def _customer(self, customer_name):
+        profile = self.customer_profiles.get(customer_name)
+        if profile is None:
+            raise CustomerNotFound(customer_name)
+        return profile
+
+    def _product(self, product_id):
+        product = self.inventory.get(product_id)
+        if product is None:
+            raise ProductNotFound(product_id)
+        return product
+
+    def _price(self, product_id):
+        return self.inventory.get(product_id, {}).get('price', 0)
+
+    def _record_order(self, customer_name, product_id, name, quantity):
+        ordered_at = self._now()
+        order_history = self.customer_profiles[customer_name]['order_history']
+        order_history.append(product_id, name, quantity, ordered_at)
+
+        # Only the latest order of each product is billed, so it replaces the previous subtotal.
+        totals = self.payment_totals[customer_name]
+        subtotal = quantity * self._price(product_id)
+        totals['total'] += subtotal - totals['subtotals'].pop(product_id, 0)
+        totals['subtotals'][product_id] = subtotal  # re-inserted, so the latest order is last
+        totals['quantities'][product_id] = quantity
+        totals['lines'] += 1
+        self.product_customers.setdefault(product_id, set()).add(customer_name)
+        return order_history[-1]
+
+    def _reprice(self, product_id, old_price):
+        new_price = self._price(product_id)
+        if new_price == old_price:
+            return
+        for customer_name in self.product_customers.get(product_id, ()):
+            totals = self.payment_totals[customer_name]
+            subtotal = totals['quantities'][product_id] * new_price
+            totals['total'] += subtotal - totals['subtotals'][product_id]
+            totals['subtotals'][product_id] = subtotal
+
+    @logged
     def add_customer_profile(self, customer_name, customer_id):
         """
         Add a customer profile to the e-commerce platform.
@@ -15,8 +319,15 @@ class ECommercePlatform:
         Returns:
         None
         """
-        self.customer_profiles[customer_name] = {'customer_id': customer_id, 'cart': {}, 'order_history': []}
-
+        with self._orders_lock:
+            if customer_name in self.customer_profiles:
+                for product_id in self.payment_totals[customer_name]['subtotals']:
+                    self.product_customers[product_id].discard(customer_name)
+            self.customer_profiles[customer_name] = {'customer_id': customer_id, 'cart': {},
+                                                     'order_history': OrderLog(self.order_names)}
+            self.payment_totals[customer_name] = {'total': 0, 'subtotals': {}, 'quantities': {}, 'lines': 0}
+
+    @logged
     def create_product_category(self, product_id, name, description, quantity, price):
         """
         Create a product category and add it to the inventory.
@@ -31,8 +342,33 @@ class ECommercePlatform:
         Returns:
         None
         """
-        self.inventory[product_id] = {'name': name, 'description': description, 'quantity': quantity, 'price': price}
-        print("Product category created successfully.")
+        with self._stock_lock(product_id):
+            old_price = self._price(product_id)
+            self._put_product(product_id, {'name': name, 'description': description, 'quantity': quantity, 'price': price})
+            with self._orders_lock:
+                self._reprice(product_id, old_price)
+
+    @logged
+    def add_product_price(self, product_id, price):
+        """
+        Add or update the price of a product in the inventory.
+
+        Parameters:
+        - product_id (int): Unique identifier for the product.
+        - price (float): Price of the product.
+
+        Returns:
+        None
+
+        Raises:
+        ProductNotFound: The product is not in the inventory; add it first.
+        """
+        with self._stock_lock(product_id):
+            product = self._product(product_id)
+            old_price = product['price']
+            product['price'] = price
+            with self._orders_lock:
+                self._reprice(product_id, old_price)
 
     def check_product_availability(self, product_id):
         """
@@ -61,6 +397,88 @@ class ECommercePlatform:
         else:
             return 0  # Product not found, quantity is 0
 
+    def total_stock_value(self):
+        """
+        Calculate the value of all stock in the inventory.
+
+        Returns:
+        float: Sum of quantity * price over all products.
+        """
+        if hasattr(self.inventory, 'total_stock_value'):
+            return self.inventory.total_stock_value()
+        return sum(product['quantity'] * product['price'] for product in self.inventory.values())
+
+    def low_stock_products(self, threshold):
+        """
+        Find the products that are running out.
+
+        Parameters:
+        - threshold (int): Highest quantity that counts as low stock.
+
+        Returns:
+        list: IDs of the products whose quantity is at or below the threshold, lowest quantity first;
+        products with the same quantity are in no particular order.
+        """
+        with self._index_lock:
+            end = bisect.bisect_right(self.stock_levels, threshold)
+            return [product_id for quantity in self.stock_levels[:end] for product_id in self.stock_buckets[quantity]]
+
+    def lowest_in_stock(self, count):
+        """
+        Find the products with the least stock.
+
+        Parameters:
+        - count (int): Number of products to return.
+
+        Returns:
+        list: (product ID, quantity) of the `count` products with the lowest quantities, lowest first;
+        ties are broken by the lower product ID.
+        """
+        lowest = []
+        with self._index_lock:
+            for quantity in self.stock_levels:
+                if len(lowest) >= count:
+                    break
+                # Only as many IDs as are still missing are taken from the bucket, not the whole of it sorted.
+                lowest.extend((product_id, quantity)
+                              for product_id in heapq.nsmallest(count - len(lowest), self.stock_buckets[quantity]))
+        return lowest
+
+    def add_low_stock_callback(self, threshold, callback):
+        """
+        Call callback(product_id, quantity, threshold) whenever a product's quantity drops from
+        above the threshold to or below it, e.g. to reorder the product.
+
+        The callback runs in the thread that changed the quantity, after the change is
+        complete and no platform lock is held, so it may call the platform itself.
+        Callbacks are not saved by the store; register them again after opening one.
+
+        Parameters:
+        - threshold (int): Quantity at or below which the product needs restocking.
+        - callback (callable): Function to call.
+
+        Returns:
+        None
+        """
+        # Replaced rather than changed in place, so a thread looping over the old list is unaffected
+        self.stock_callbacks = self.stock_callbacks + [(threshold, callback)]
+
+    def remove_low_stock_callback(self, threshold, callback):
+        """
+        Stop calling a callback registered with add_low_stock_callback.
+
+        Parameters:
+        - threshold (int): Threshold the callback was registered with.
+        - callback (callable): Function registered.
+
+        Returns:
+        None
+        """
+        callbacks = list(self.stock_callbacks)
+        callbacks.remove((threshold, callback))
+        self.stock_callbacks = callbacks
+
+    @logged
     def add_product(self, product_id, name, quantity, price, description, customer_name):
         """
         Add a product to the inventory.
@@ -75,19 +493,21 @@ class ECommercePlatform:
 
         Returns:
         None
+
+        Raises:
+        CustomerNotFound: The customer is not registered.
         """
-        if customer_name in self.customer_profiles:
-            self.inventory[product_id] = {'name': name, 'quantity': quantity, 'price': price, 'description': description}
-            print("Product added to inventory successfully.")
+        self._customer(customer_name)
+        with self._stock_lock(product_id):
+            old_price = self._price(product_id)
+            self._put_product(product_id, {'name': name, 'quantity': quantity, 'price': price, 'description': description})
+            with self._orders_lock:
+                self._reprice(product_id, old_price)
 
-            # Update customer's order history
-            order_history = self.customer_profiles[customer_name].get('order_history', [])
-            order_history.append({'product_id': product_id, 'product_name': name, 'quantity': quantity})
-            self.customer_profiles[customer_name]['order_history'] = order_history
-
-        else:
-            print("Customer not found. Please reenter the registered customer name or ID.")
+                # Update customer's order history
+                self._record_order(customer_name, product_id, name, quantity)
 
+    @logged
     def start_to_order(self, customer_name, product_id, name, quantity, price, description):
         """
         Start the order process by adding a product to the customer's cart.
@@ -101,35 +521,101 @@ class ECommercePlatform:
         - description (str): Description of the product.
 
         Returns:
-        None
+        OrderLine: The order added to the customer's order history.
+
+        Raises:
+        CustomerNotFound, ProductNotFound, InvalidQuantity or InsufficientStock.
         """
-        if customer_name in self.customer_profiles:
-            if product_id in self.inventory:
-                # Check product availability and update inventory
-                if self.inventory[product_id]['quantity'] >= quantity:
-                    # Add the product to the customer's cart
-                    self.customer_profiles[customer_name]['cart'][product_id] = {
-                        'name': name,
-                        'quantity': quantity,
-                        'price': price,
-                        'description': description
-                    }
-                    print("Product added to the cart successfully.")
-
-                    # Update product quantity in inventory
-                    self.inventory[product_id]['quantity'] -= quantity
-
-                    # Update customer's order history
-                    order_history = self.customer_profiles[customer_name].get('order_history', [])
-                    order_history.append({'product_id': product_id, 'product_name': name, 'quantity': quantity})
-                    self.customer_profiles[customer_name]['order_history'] = order_history
-                else:
-                    print("Insufficient quantity in the inventory.")
-            else:
-                print("Product ID not found in inventory.")
-        else:
-            print("Customer not found. Please reenter the registered customer name.")
+        profile = self._customer(customer_name)
+        self._product(product_id)
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise InvalidQuantity(quantity)
+
+        # Check product availability and take the quantity out of the inventory in one step
+        reservation_id = self._reserve(product_id, quantity)
+        if reservation_id is None:
+            raise InsufficientStock(product_id, quantity, self.check_current_quantity(product_id))
+        try:
+            with self._orders_lock:
+                # Add the product to the customer's cart
+                profile['cart'][product_id] = {
+                    'name': name,
+                    'quantity': quantity,
+                    'price': price,
+                    'description': description
+                }
+
+                # Update customer's order history
+                order = self._record_order(customer_name, product_id, name, quantity)
+        except BaseException:
+            self._release(reservation_id)
+            raise
+        self._commit(reservation_id)
+        return order
+
+    def place_orders(self, lines):
+        """
+        Place many orders at once: either every line is ordered or, if any line fails, none is.
+
+        Each ordered line is added to the customer's cart and order history like start_to_order
+        does, with the product's name, price and description taken from the inventory.
 
+        Parameters:
+        - lines (iterable): (customer name, product ID, quantity) tuples; read once.
+
+        Returns:
+        BatchResult: accepted (bool), orders (number of lines ordered) and errors, a list of
+        LineErrors whose line is the index in lines.
+
+        Raises:
+        EmptyBatch if there are no lines.
+        """
+        # The lines are checked and then ordered, and logged as they were given, so a
+        # generator would be used up by the checks: take them as a list first.
+        lines = list(lines)
+        if not lines:
+            raise EmptyBatch()
+        return self._place_orders(lines)
+
+    @logged
+    def _place_orders(self, lines):
+        errors = []
+        demand = {}  # product ID -> quantity ordered by the lines so far
+        with self._stock_locks_for({line[1] for line in lines}), self._orders_lock:
+            for number, (customer_name, product_id, quantity) in enumerate(lines):
+                if customer_name not in self.customer_profiles:
+                    error = CustomerNotFound(customer_name)
+                elif product_id not in self.inventory:
+                    error = ProductNotFound(product_id)
+                elif not isinstance(quantity, int) or quantity <= 0:
+                    error = InvalidQuantity(quantity)
+                else:
+                    demand[product_id] = demand.get(product_id, 0) + quantity
+                    available = self.inventory[product_id]['quantity']
+                    if demand[product_id] <= available:
+                        continue
+                    error = InsufficientStock(product_id, demand[product_id], available)
+                errors.append(LineError(number, customer_name, product_id, error))
+            if errors:
+                return BatchResult(False, 0, errors)
+
+            products = {}
+            for product_id, quantity in demand.items():
+                product = self.inventory[product_id]
+                self._set_stock(product_id, product['quantity'] - quantity)
+                products[product_id] = (product['name'], product['price'], product['description'])
+            for customer_name, product_id, quantity in lines:
+                name, price, description = products[product_id]
+                self.customer_profiles[customer_name]['cart'][product_id] = {
+                    'name': name,
+                    'quantity': quantity,
+                    'price': price,
+                    'description': description
+                }
+                self._record_order(customer_name, product_id, name, quantity)
+        return BatchResult(True, len(lines), [])
+
+    @logged
     def update_product_quantity_in_inventory(self, product_id, new_quantity):
         """
         Update the quantity of a product in the inventory.
@@ -140,119 +626,114 @@ class ECommercePlatform:
 
         Returns:
         None
+
+        Raises:
+        ProductNotFound: The product is not in the inventory.
         """
-        if product_id in self.inventory:
-            self.inventory[product_id]['quantity'] = new_quantity
-            print("Product quantity updated successfully in inventory.")
-        else:
-            print("Product not found in inventory.")
+        with self._stock_lock(product_id):
+            self._product(product_id)
+            self._set_stock(product_id, new_quantity)
 
-    def delete_product(self, product_id):
+    @logged
+    def delete_product(self, product_id, deletion_quantity=0):
         """
-        Delete a product from the inventory, allowing the customer to input the deletion quantity.
+        Delete a quantity of a product from the inventory, or the product itself if none is left.
         If the deletion quantity is less than or equal to the current product quantity,
-        calculate the net quantity and store it back in the dictionary.
-        If the deletion quantity is more than the current quantity, display an appropriate message.
+        calculate the net quantity and store it back in the inventory.
 
         Parameters:
         - product_id (int): Unique identifier for the product.
+        - deletion_quantity (int): Quantity to delete; ignored when the current quantity is 0.
 
         Returns:
-        None
+        Deletion: The quantity deleted and left, and whether the product was removed.
+
+        Raises:
+        ProductNotFound, or InsufficientStock if the deletion quantity is more than the current quantity.
         """
-        if product_id in self.inventory:
-            current_quantity = self.inventory[product_id]['quantity']
+        with self._all_stock_locks():
+            current_quantity = self._product(product_id)['quantity']
             if current_quantity == 0:
+                old_price = self._price(product_id)
                 del self.inventory[product_id]
-                print("Product deleted from inventory.")
-            else:
-                deletion_quantity = int(input(f"Enter deletion quantity (current quantity: {current_quantity}): "))
-                if deletion_quantity <= current_quantity:
-                    net_quantity = current_quantity - deletion_quantity
-                    self.inventory[product_id]['quantity'] = net_quantity
-                    print(f"{deletion_quantity} items deleted. Net quantity: {net_quantity}")
-                else:
-                    print(f"Couldn't delete. The current product has only {current_quantity} items.")
-        else:
-            print("Product not found in inventory. Unable to delete.")
-
-    def check_total_payment(self, customer_name):
+                self._update_stock_index(product_id, 0, None)
+                with self._orders_lock:
+                    self._reprice(product_id, old_price)
+                return Deletion(product_id, 0, 0, True)
+            if deletion_quantity > current_quantity:
+                raise InsufficientStock(product_id, deletion_quantity, current_quantity)
+            net_quantity = current_quantity - deletion_quantity
+            self._set_stock(product_id, net_quantity)
+            return Deletion(product_id, deletion_quantity, net_quantity, False)
+
+    def get_total_payment(self, customer_name):
         """
-        Check the total payment for a customer's order by customer name.
+        Get the total payment for a customer: the latest order of each product at its current price.
 
         Parameters:
         - customer_name (str): Customer name.
 
         Returns:
-        None
-        """
-        found_customer = False
-
-        # Check if the input is a customer name
-        if customer_name in self.customer_profiles:
-            found_customer = True
-
-        if found_customer:
-            order_history = self.customer_profiles[customer_name].get('order_history', [])
-            if order_history:
-                print(f"\nTotal Payment for Customer Name {customer_name}:")
-                total_payment = 0
-                product_totals = {}  # To store the latest quantity * price for each product category
-
-                for order in reversed(order_history):
-                    product_id = order['product_id']
-                    quantity = order['quantity']
-                    price = self.inventory.get(product_id, {}).get('price', 0)
+        float: Total payment.
 
-                    if product_id not in product_totals:
-                        product_totals[product_id] = quantity * price
-                        total_payment += quantity * price
+        Raises:
+        CustomerNotFound: The customer is not registered.
+        """
+        self._customer(customer_name)
+        return self.payment_totals[customer_name]['total']
 
-                # Print individual product totals
-                for product_id, product_total in product_totals.items():
-                    product_name = self.inventory.get(product_id, {}).get('name', 'Unknown Product')
-                    print(f"Product: {product_name}, Order Total: ${product_total}")
+    def check_total_payment(self, customer_name):
+        """
+        Check the total payment for a customer's order by customer name.
 
-                print(f"Total Payment: ${total_payment}")
-            else:
-                print(f"\nNo order history found for Customer Name {customer_name}.")
-        else:
-            print(f"Customer with name '{customer_name}' not found. Please reenter the registered name.")
+        Parameters:
+        - customer_name (str): Customer name.
 
+        Returns:
+        PaymentSummary: The total, and the total of each product, most recently ordered first.
+        The list of products is empty if the customer has not ordered anything.
 
-    def check_order_history(self, customer_name):
+        Raises:
+        CustomerNotFound: The customer is not registered.
+        """
+        self._customer(customer_name)
+        with self._orders_lock:
+            totals = self.payment_totals[customer_name]
+            products = [ProductTotal(product_id, self.inventory.get(product_id, {}).get('name', 'Unknown Product'), total)
+                        for product_id, total in reversed(totals['subtotals'].items())]
+            return PaymentSummary(customer_name, totals['total'], products)
+
+    def check_order_history(self, customer_name, start=None, end=None):
         """
         Check the order history of a customer by customer name.
 
         Parameters:
         - customer_name (str): Customer name.
+        - start (float): Only orders placed at or after this time.time(), if given.
+        - end (float): Only orders placed before this time.time(), if given.
 
         Returns:
-        None
-        """
-        found_customer = False
-
-        # Check if the input is a customer name
-        if customer_name in self.customer_profiles:
-            found_customer = True
+        list: The customer's OrderLines, oldest first.
 
-        if found_customer:
-            order_history = self.customer_profiles[customer_name].get('order_history', [])
-            if order_history:
-                print(f"\nOrder History for Customer Name {customer_name}:")
-                for order in order_history:
-                    print(f"Product: {order['product_name']}, Quantity: {order['quantity']}")
-            else:
-                print(f"\nNo order history found for Customer Name {customer_name}.")
-        else:
-            print(f"Customer with name '{customer_name}' not found. Please reenter the registered name.")
+        Raises:
+        CustomerNotFound: The customer is not registered.
+        """
+        profile = self._customer(customer_name)
+        with self._orders_lock:
+            return profile['order_history'].between(start, end)
 
 
-def text_interface():
+def text_interface(data_dir=os.environ.get("ECOMMERCE_DATA_DIR")):
     print("Welcome to the Text-based E-Commerce Platform!")
 
-    # Create an instance of the ECommercePlatform class
-    ecommerce_platform = ECommercePlatform()
+    # Create an instance of the ECommercePlatform class, loaded from data_dir if given
+    store = None
+    if data_dir:
+        from wal import PlatformStore
+        store = PlatformStore(data_dir)
+        ecommerce_platform = store.open(ECommercePlatform)
+    else:
+        ecommerce_platform = ECommercePlatform()
 
     while True:
         print("\nMenu:")
@@ -269,65 +750,97 @@ def text_interface():
 
         choice = input("Enter your choice (1/2/3/4/5/6/7/8/9/10): ")
 
-        if choice == '1':
-            customer_name = input("Enter Customer Name: ")
-            customer_id = int(input("Enter Customer ID: "))
-            ecommerce_platform.add_customer_profile(customer_name, customer_id)
-            print("Customer profile created successfully!")
-
-        elif choice == '2':
-            product_id = int(input("Enter Product ID: "))
-            name = input("Enter Product Name: ")
-            description = input("Enter Product Description: ")
-            quantity = int(input("Enter Initial Quantity: "))
-            price = float(input("Enter Product Price: "))
-            ecommerce_platform.create_product_category(product_id, name, description, quantity, price)
-
-        elif choice == '3':
-            product_id = int(input("Enter Product ID to check availability: "))
-            if ecommerce_platform.check_product_availability(product_id):
-                print("Product is available.")
-            else:
-                print("Product is not available.")
-
-        elif choice == '4':
-            product_id = int(input("Enter Product ID to check current quantity: "))
-            current_quantity = ecommerce_platform.check_current_quantity(product_id)
-            print(f"Current quantity of the product: {current_quantity}")
-
-        elif choice == '5':
-            customer_name = input("Enter Customer Name: ")
-            product_id = int(input("Enter Product ID: "))
-            name = input("Enter Product Name: ")
-            quantity = int(input("Enter Initial Quantity: "))
-            price = float(input("Enter Product Price: "))
-            description = input("Enter Product Description: ")
-            ecommerce_platform.start_to_order(customer_name, product_id, name, quantity, price, description)
-
-        elif choice == '6':
-            product_id = int(input("Enter Product ID to update quantity: "))
-            new_quantity = int(input("Enter New Quantity: "))
-            ecommerce_platform.update_product_quantity_in_inventory(product_id, new_quantity)
-            print("Product quantity updated successfully in inventory!")
-
-        elif choice == '7':
-            product_id = int(input("Enter Product ID to delete: "))
-            ecommerce_platform.delete_product(product_id)
-
-        elif choice == '8':
-            customer_input = input("Enter Customer Name or ID to check total payment: ")
-            ecommerce_platform.check_total_payment(customer_input)
-
-        elif choice == '9':
-            customer_input = input("Enter Customer Name or ID to check order history: ")
-            ecommerce_platform.check_order_history(customer_input)
-
-        elif choice == '10':
+        if choice == '10':
             print("Exiting the Text-based E-Commerce Platform. Thank you!")
+            if store is not None:
+                store.close()
             break
+        try:
+            run_menu_choice(ecommerce_platform, choice)
+        except PlatformError as e:
+            print(e)
+
+
+def run_menu_choice(ecommerce_platform, choice):
+    """Ask for the inputs of one menu choice, call the platform, and print the outcome."""
+    if choice == '1':
+        customer_name = input("Enter Customer Name: ")
+        customer_id = int(input("Enter Customer ID: "))
+        ecommerce_platform.add_customer_profile(customer_name, customer_id)
+        print("Customer profile created successfully!")
+
+    elif choice == '2':
+        product_id = int(input("Enter Product ID: "))
+        name = input("Enter Product Name: ")
+        description = input("Enter Product Description: ")
+        quantity = int(input("Enter Initial Quantity: "))
+        price = float(input("Enter Product Price: "))
+        ecommerce_platform.create_product_category(product_id, name, description, quantity, price)
+        print("Product category created successfully.")
 
+    elif choice == '3':
+        product_id = int(input("Enter Product ID to check availability: "))
+        if ecommerce_platform.check_product_availability(product_id):
+            print("Product is available.")
         else:
-            print("Invalid choice. Please enter 1, 2, 3, 4, 5, 6, 7, 8, 9, 10")
+            print("Product is not available.")
+
+    elif choice == '4':
+        product_id = int(input("Enter Product ID to check current quantity: "))
+        current_quantity = ecommerce_platform.check_current_quantity(product_id)
+        print(f"Current quantity of the product: {current_quantity}")
+
+    elif choice == '5':
+        customer_name = input("Enter Customer Name: ")
+        product_id = int(input("Enter Product ID: "))
+        name = input("Enter Product Name: ")
+        quantity = int(input("Enter Initial Quantity: "))
+        price = float(input("Enter Product Price: "))
+        description = input("Enter Product Description: ")
+        ecommerce_platform.start_to_order(customer_name, product_id, name, quantity, price, description)
+        print("Product added to the cart successfully.")
+
+    elif choice == '6':
+        product_id = int(input("Enter Product ID to update quantity: "))
+        new_quantity = int(input("Enter New Quantity: "))
+        ecommerce_platform.update_product_quantity_in_inventory(product_id, new_quantity)
+        print("Product quantity updated successfully in inventory!")
+
+    elif choice == '7':
+        product_id = int(input("Enter Product ID to delete: "))
+        current_quantity = ecommerce_platform.check_current_quantity(product_id)
+        deletion_quantity = 0
+        if current_quantity:
+            deletion_quantity = int(input(f"Enter deletion quantity (current quantity: {current_quantity}): "))
+        deletion = ecommerce_platform.delete_product(product_id, deletion_quantity)
+        if deletion.removed:
+            print("Product deleted from inventory.")
+        else:
+            print(f"{deletion.deleted_quantity} items deleted. Net quantity: {deletion.remaining_quantity}")
+
+    elif choice == '8':
+        customer_input = input("Enter Customer Name or ID to check total payment: ")
+        summary = ecommerce_platform.check_total_payment(customer_input)
+        if summary.products:
+            print(f"\nTotal Payment for Customer Name {customer_input}:")
+            for product in summary.products:
+                print(f"Product: {product.product_name}, Order Total: ${product.total}")
+            print(f"Total Payment: ${summary.total}")
+        else:
+            print(f"\nNo order history found for Customer Name {customer_input}.")
+
+    elif choice == '9':
+        customer_input = input("Enter Customer Name or ID to check order history: ")
+        order_history = ecommerce_platform.check_order_history(customer_input)
+        if order_history:
+            print(f"\nOrder History for Customer Name {customer_input}:")
+            for order in order_history:
+                print(f"Product: {order.product_name}, Quantity: {order.quantity}")
+        else:
+            print(f"\nNo order history found for Customer Name {customer_input}.")
+
+    else:
+        print("Invalid choice. Please enter 1, 2, 3, 4, 5, 6, 7, 8, 9, 10")
 
 
 # Run the text-based interface
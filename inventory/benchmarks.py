@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the ECommercePlatform in "8.Fix total payment.py".
+
+    python benchmarks.py memory --products 1000000
+    python benchmarks.py orders --threads 1 2 4 8 16 --stock 20000
+    python benchmarks.py batch --lines 100000 --batch-size 1000
+    python benchmarks.py history --customers 1000 --orders 1000
+"""
+import argparse
+import gc
+import importlib.util
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+from columnar import ColumnarInventory, StringTable
+from order_log import OrderLog
+
+PLATFORM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "8.Fix total payment.py")
+
+
+def load_platform():
+    """Import the platform script; its file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location("fix_total_payment", PLATFORM_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_memory(args):
+    """Fill each inventory backend with the same products and compare memory and aggregate query times."""
+    module = load_platform()
+    names = ["Product {}".format(i) for i in range(args.distinct_names)]
+    for backend, make in (("dict", dict), ("columnar", ColumnarInventory)):
+        gc.collect()
+        tracemalloc.start()
+        platform = module.ECommercePlatform(inventory=make())
+        began = time.perf_counter()
+        for product_id in range(args.products):
+            platform.create_product_category(product_id, names[product_id % len(names)], "Description",
+                                             product_id % 100, float(product_id % 1000) / 10)
+        fill_seconds = time.perf_counter() - began
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        began = time.perf_counter()
+        value = platform.total_stock_value()
+        value_seconds = time.perf_counter() - began
+        began = time.perf_counter()
+        low = len(platform.low_stock_products(args.threshold))
+        low_seconds = time.perf_counter() - began
+
+        print("{:8} {} products: {:7.1f} MB ({:5.0f} bytes/product), filled in {:5.2f} s, "
+              "stock value {:.2f} in {:6.1f} ms, {} low stock in {:6.1f} ms".format(
+                  backend, args.products, used / 1e6, used / args.products, fill_seconds,
+                  value, value_seconds * 1000, low, low_seconds * 1000))
+        del platform
+    return 0
+
+
+def legacy_start_to_order(platform, customer_name, product_id, quantity):
+    """start_to_order as it was before reserve/commit: check, then decrement in a separate step."""
+    product = platform.inventory[product_id]
+    if product['quantity'] >= quantity:
+        time.sleep(0)  # a thread switch here is all it takes to oversell
+        product['quantity'] -= quantity
+        platform._record_order(customer_name, product_id, product['name'], quantity)
+
+
+def place_order(module, platform, customer_name, product_id, quantity):
+    try:
+        platform.start_to_order(customer_name, product_id, "", quantity, 1.0, "")
+    except module.InsufficientStock:
+        pass
+
+
+def run_orders(module, threads, args, place):
+    """Let `threads` threads order hot products until the stock runs out; return orders/s and oversold units."""
+    platform = module.ECommercePlatform()
+    for product_id in range(args.products):
+        platform.create_product_category(product_id, "Product {}".format(product_id), "", args.stock, 1.0)
+    for i in range(threads):
+        platform.add_customer_profile("customer {}".format(i), i)
+    start = threading.Barrier(threads + 1)
+
+    def customer(i):
+        rng = random.Random(i)
+        start.wait()
+        for _ in range(args.attempts):
+            place(platform, "customer {}".format(i), rng.randrange(args.products), 1)
+
+    workers = [threading.Thread(target=customer, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    began = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - began
+
+    sold = sum(totals['lines'] for totals in platform.payment_totals.values())
+    left = sum(product['quantity'] for product in platform.inventory.values())
+    # Units recorded as sold beyond what was taken out of the inventory, plus any negative stock
+    oversold = sold - (args.products * args.stock - left) + sum(
+        -product['quantity'] for product in platform.inventory.values() if product['quantity'] < 0)
+    return threads * args.attempts / seconds, sold, oversold
+
+
+def bench_orders(args):
+    """Concurrent orders of a few hot products with start_to_order and with the old check-then-decrement."""
+    module = load_platform()
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(args.switch_interval)
+    failed = False
+    try:
+        results = []
+        for name, place in (
+            ("reserve", lambda platform, customer, product_id, quantity:
+                place_order(module, platform, customer, product_id, quantity)),
+            ("legacy", legacy_start_to_order),
+        ):
+            for threads in args.threads:
+                results.append((name, threads) + run_orders(module, threads, args, place))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    for name, threads, rate, sold, oversold in results:
+        print("{:8} {:3} threads: {:9.0f} attempts/s, {} sold of {} in stock, oversold {}".format(
+            name, threads, rate, sold, args.products * args.stock, oversold))
+        if name == "reserve" and oversold:
+            failed = True
+    return 1 if failed else 0
+
+
+def bench_batch(args):
+    """Ingest the same order feed line by line with start_to_order and in batches with place_orders."""
+    module = load_platform()
+    rng = random.Random(0)
+    feed = [("customer {}".format(rng.randrange(args.customers)), rng.randrange(args.products), rng.randint(1, 3))
+            for _ in range(args.lines)]
+    for name in ("start_to_order", "place_orders"):
+        platform = module.ECommercePlatform()
+        for product_id in range(args.products):
+            platform.create_product_category(product_id, "Product {}".format(product_id), "", args.lines * 3, 1.5)
+        for i in range(args.customers):
+            platform.add_customer_profile("customer {}".format(i), i)
+        began = time.perf_counter()
+        if name == "start_to_order":
+            for customer_name, product_id, quantity in feed:
+                platform.start_to_order(customer_name, product_id, "Product {}".format(product_id), quantity, 1.5, "")
+        else:
+            for start in range(0, len(feed), args.batch_size):
+                result = platform.place_orders(feed[start:start + args.batch_size])
+                assert result.accepted, result.errors[:3]
+        seconds = time.perf_counter() - began
+        print("{:15} {} lines: {:9.0f} lines/s".format(name, args.lines, args.lines / seconds))
+    return 0
+
+
+def bench_history(args):
+    """Order histories as lists of dicts (the old format) and as OrderLogs: memory, full scans and time slices."""
+    rng = random.Random(0)
+    orders = [(rng.randrange(args.products), rng.randint(1, 5)) for _ in range(args.orders)]
+    names = StringTable()
+    for backend in ("list", "OrderLog"):
+        gc.collect()
+        tracemalloc.start()
+        histories = []
+        for customer in range(args.customers):
+            if backend == "list":
+                history = []
+                for i, (product_id, quantity) in enumerate(orders):
+                    # Names are read with input(), so every order held its own copy
+                    history.append({'product_id': product_id, 'product_name': "Product {}".format(product_id),
+                                    'quantity': quantity, 'ordered_at': float(i)})
+            else:
+                history = OrderLog(names)
+                for i, (product_id, quantity) in enumerate(orders):
+                    history.append(product_id, "Product {}".format(product_id), quantity, float(i))
+            histories.append(history)
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        began = time.perf_counter()
+        for history in histories:
+            for order in history:
+                pass
+        scan_seconds = time.perf_counter() - began
+
+        # Two fields of every order, as a report would read them
+        began = time.perf_counter()
+        for history in histories:
+            if backend == "list":
+                for product_id, quantity in ((order['product_id'], order['quantity']) for order in history):
+                    pass
+            else:
+                for product_id, quantity in history.columns('product_id', 'quantity'):
+                    pass
+        fields_seconds = time.perf_counter() - began
+
+        began = time.perf_counter()
+        total = 0
+        for history in histories:
+            if backend == "list":
+                total += sum(order['quantity'] for order in history)
+            else:
+                total += sum(history.quantities)
+        sum_seconds = time.perf_counter() - began
+
+        # The last tenth of each history by time
+        start = args.orders * 0.9
+        began = time.perf_counter()
+        recent = 0
+        for history in histories:
+            if backend == "list":
+                recent += len([order for order in history if order['ordered_at'] >= start])
+            else:
+                recent += len(history.between(start))
+        slice_seconds = time.perf_counter() - began
+
+        count = args.customers * args.orders
+        print("{:8} {} orders: {:7.1f} MB ({:4.0f} bytes/order), iterate {:5.0f} ms, two fields {:5.0f} ms, "
+              "sum quantities {:5.0f} ms, last 10% {:5.0f} ms ({} orders)".format(
+                  backend, count, used / 1e6, used / count, scan_seconds * 1000, fields_seconds * 1000,
+                  sum_seconds * 1000, slice_seconds * 1000, recent))
+        del histories
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    memory_parser = commands.add_parser("memory", help="memory and aggregate queries of the inventory backends")
+    memory_parser.add_argument("--products", type=int, default=1000000)
+    memory_parser.add_argument("--distinct-names", type=int, default=1000)
+    memory_parser.add_argument("--threshold", type=int, default=5)
+    memory_parser.set_defaults(run=bench_memory)
+
+    orders_parser = commands.add_parser("orders", help="concurrent start_to_order calls on a few hot products")
+    orders_parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    orders_parser.add_argument("--products", type=int, default=4)
+    orders_parser.add_argument("--stock", type=int, default=20000, help="initial quantity of each product")
+    orders_parser.add_argument("--attempts", type=int, default=20000, help="orders each thread tries to place")
+    orders_parser.add_argument("--switch-interval", type=float, default=1e-6,
+                               help="sys.setswitchinterval() during the run; small values switch threads often")
+    orders_parser.set_defaults(run=bench_orders)
+
+    batch_parser = commands.add_parser("batch", help="order feed ingestion, one by one and in batches")
+    batch_parser.add_argument("--lines", type=int, default=100000)
+    batch_parser.add_argument("--batch-size", type=int, default=1000)
+    batch_parser.add_argument("--products", type=int, default=1000)
+    batch_parser.add_argument("--customers", type=int, default=5000)
+    batch_parser.set_defaults(run=bench_batch)
+
+    history_parser = commands.add_parser("history", help="memory and scans of order histories")
+    history_parser.add_argument("--customers", type=int, default=1000)
+    history_parser.add_argument("--orders", type=int, default=1000, help="orders per customer")
+    history_parser.add_argument("--products", type=int, default=5000)
+    history_parser.set_defaults(run=bench_history)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
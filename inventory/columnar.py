@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Column-oriented storage for ECommercePlatform.inventory.
+
+The default inventory is a dict of per-product dicts.  ColumnarInventory
+keeps the same mapping interface (inventory[product_id]['quantity'] -= 1,
+inventory.get(product_id, {}).get('price', 0), product_id in inventory,
+...) but stores one typed array per column:
+
+    ids           array('q')  product ID of each row
+    quantities    array('q')
+    prices        array('d')
+    names         array('I')  codes into a table of distinct names
+    descriptions  array('I')  codes into a table of distinct descriptions
+
+plus a product ID -> row dict.  Deleting a product moves the last row into
+its place, so rows stay dense.
+
+    platform = ECommercePlatform(inventory=ColumnarInventory())
+"""
+import operator
+from array import array
+
+COLUMNS = ('name', 'description', 'quantity', 'price')
+
+
+class StringTable:
+    """Dictionary encoding: each distinct string is stored once and referred to by its code."""
+
+    def __init__(self):
+        self.strings = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def decode(self, code):
+        return self.strings[code]
+
+
+class ProductRow:
+    """A view of one product's row that reads and writes the columns like the product dict did."""
+
+    __slots__ = ('inventory', 'product_id')
+
+    def __init__(self, inventory, product_id):
+        self.inventory = inventory
+        self.product_id = product_id
+
+    def __getitem__(self, column):
+        return self.inventory.get_value(self.product_id, column)
+
+    def __setitem__(self, column, value):
+        self.inventory.set_value(self.product_id, column, value)
+
+    def __contains__(self, column):
+        return column in COLUMNS
+
+    def get(self, column, default=None):
+        if column not in COLUMNS:
+            return default
+        return self[column]
+
+    def keys(self):
+        return COLUMNS
+
+    def __iter__(self):
+        return iter(COLUMNS)
+
+    def __eq__(self, other):
+        return dict(self) == dict(other)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarInventory:
+    """Products stored as typed arrays, one per column, behind the inventory dict interface."""
+
+    def __init__(self):
+        self.ids = array('q')
+        self.quantities = array('q')
+        self.prices = array('d')
+        self.names = array('I')
+        self.descriptions = array('I')
+        self.rows = {}  # product ID -> row
+        self.name_table = StringTable()
+        self.description_table = StringTable()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, product_id):
+        return product_id in self.rows
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def keys(self):
+        return list(self.ids)
+
+    def items(self):
+        return [(product_id, ProductRow(self, product_id)) for product_id in self.ids]
+
+    def __getitem__(self, product_id):
+        if product_id not in self.rows:
+            raise KeyError(product_id)
+        return ProductRow(self, product_id)
+
+    def get(self, product_id, default=None):
+        if product_id not in self.rows:
+            return default
+        return ProductRow(self, product_id)
+
+    def __setitem__(self, product_id, product):
+        """Add or replace a product from a dict with name, description, quantity and price."""
+        name = self.name_table.encode(product.get('name', ''))
+        description = self.description_table.encode(product.get('description', ''))
+        row = self.rows.get(product_id)
+        if row is None:
+            self.rows[product_id] = len(self.ids)
+            self.ids.append(product_id)
+            self.quantities.append(product.get('quantity', 0))
+            self.prices.append(product.get('price', 0))
+            self.names.append(name)
+            self.descriptions.append(description)
+        else:
+            self.quantities[row] = product.get('quantity', 0)
+            self.prices[row] = product.get('price', 0)
+            self.names[row] = name
+            self.descriptions[row] = description
+
+    def __delitem__(self, product_id):
+        row = self.rows.pop(product_id)
+        last = len(self.ids) - 1
+        if row != last:
+            for column in (self.ids, self.quantities, self.prices, self.names, self.descriptions):
+                column[row] = column[last]
+            self.rows[self.ids[row]] = row
+        for column in (self.ids, self.quantities, self.prices, self.names, self.descriptions):
+            del column[last]
+
+    def get_value(self, product_id, column):
+        row = self.rows[product_id]
+        if column == 'quantity':
+            return self.quantities[row]
+        if column == 'price':
+            return self.prices[row]
+        if column == 'name':
+            return self.name_table.decode(self.names[row])
+        if column == 'description':
+            return self.description_table.decode(self.descriptions[row])
+        raise KeyError(column)
+
+    def set_value(self, product_id, column, value):
+        row = self.rows[product_id]
+        if column == 'quantity':
+            self.quantities[row] = value
+        elif column == 'price':
+            self.prices[row] = value
+        elif column == 'name':
+            self.names[row] = self.name_table.encode(value)
+        elif column == 'description':
+            self.descriptions[row] = self.description_table.encode(value)
+        else:
+            raise KeyError(column)
+
+    def total_stock_value(self):
+        """Sum of quantity * price over all products."""
+        return sum(map(operator.mul, self.quantities, self.prices))
+
+    def total_quantity(self):
+        return sum(self.quantities)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Compact order history for ECommercePlatform customers.
+
+An order_history used to be a list of {'product_id', 'product_name',
+'quantity'} dicts, a dict and a copy of the product name per order.  An
+OrderLog keeps one typed array per field instead, and product names as
+codes into a StringTable shared by all customers, so each order costs
+28 bytes:
+
+    product_ids   array('q')
+    name_codes    array('I')  codes into the shared StringTable
+    quantities    array('q')
+    ordered_at    array('d')  time.time() of each order, never decreasing
+
+Iterating or indexing it yields OrderLine tuples, and between() slices it
+by time with a binary search.  Building an OrderLine per order costs far
+more than reading the arrays, so scans that need only some fields should
+use the arrays themselves, e.g. sum(log.quantities), or columns(), e.g.
+for product_id, quantity in log.columns('product_id', 'quantity').
+"""
+import bisect
+import itertools
+from array import array
+from collections import namedtuple
+
+from columnar import StringTable
+
+OrderLine = namedtuple('OrderLine', 'product_id product_name quantity ordered_at')
+
+
+class OrderLog:
+    """Append-only orders of one customer, stored column by column."""
+
+    # OrderLine field -> array holding it; product_name is decoded from name_codes
+    _COLUMNS = {'product_id': 'product_ids', 'quantity': 'quantities', 'ordered_at': 'ordered_at'}
+
+    def __init__(self, names=None):
+        self.names = StringTable() if names is None else names
+        self.product_ids = array('q')
+        self.name_codes = array('I')
+        self.quantities = array('q')
+        self.ordered_at = array('d')
+
+    def append(self, product_id, product_name, quantity, ordered_at):
+        # Clock steps backwards would break the binary search, so times never decrease.
+        if self.ordered_at and ordered_at < self.ordered_at[-1]:
+            ordered_at = self.ordered_at[-1]
+        self.product_ids.append(product_id)
+        self.name_codes.append(self.names.encode(product_name))
+        self.quantities.append(quantity)
+        self.ordered_at.append(ordered_at)
+
+    def __repr__(self):
+        return 'OrderLog({} orders)'.format(len(self))
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def __bool__(self):
+        return len(self.product_ids) > 0
+
+    def _line(self, i):
+        return OrderLine(self.product_ids[i], self.names.decode(self.name_codes[i]), self.quantities[i],
+                         self.ordered_at[i])
+
+    def _lines(self, product_ids, name_codes, quantities, ordered_at):
+        # tuple.__new__(OrderLine, fields) is called by map() itself, skipping OrderLine's Python-level __new__
+        fields = zip(product_ids, map(self.names.strings.__getitem__, name_codes), quantities, ordered_at)
+        return map(tuple.__new__, itertools.repeat(OrderLine), fields)
+
+    def columns(self, *fields):
+        """
+        Iterate over some fields of every order, oldest first, without building OrderLines.
+
+        Parameters:
+        - fields (str): OrderLine field names, e.g. 'product_id', 'quantity'.
+
+        Returns:
+        iterator: A tuple of the requested fields per order.
+
+        Raises:
+        ValueError: If a field is not an OrderLine field.
+        """
+        columns = []
+        for field in fields:
+            if field == 'product_name':
+                columns.append(map(self.names.strings.__getitem__, self.name_codes))
+            elif field in self._COLUMNS:
+                columns.append(getattr(self, self._COLUMNS[field]))
+            else:
+                raise ValueError('Unknown OrderLine field: {!r}'.format(field))
+        return zip(*columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._lines(self.product_ids[index], self.name_codes[index], self.quantities[index],
+                                    self.ordered_at[index]))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('order index out of range')
+        return self._line(index)
+
+    def __iter__(self):
+        return self._lines(self.product_ids, self.name_codes, self.quantities, self.ordered_at)
+
+    def __reversed__(self):
+        return self._lines(self.product_ids[::-1], self.name_codes[::-1], self.quantities[::-1], self.ordered_at[::-1])
+
+    def between(self, start=None, end=None):
+        """
+        Get the orders placed in a time range.
+
+        Parameters:
+        - start (float): Earliest time.time() to include, or None for no lower bound.
+        - end (float): Time to stop before, or None for no upper bound.
+
+        Returns:
+        list: OrderLines with start <= ordered_at < end, oldest first.
+        """
+        first = 0 if start is None else bisect.bisect_left(self.ordered_at, start)
+        last = len(self) if end is None else bisect.bisect_left(self.ordered_at, end)
+        return self[first:last]
@@ -0,0 +1,73 @@
+import importlib.util
+import os
+
+import pytest
+
+PLATFORM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "4.4.Error handling(No cust data).py")
+
+
+@pytest.fixture(scope="module")
+def platform_module():
+    spec = importlib.util.spec_from_file_location("error_handling", PLATFORM_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def platform(platform_module):
+    platform = platform_module.ECommercePlatform()
+    for customer_id, name in [(1, "Ann Lee"), (2, "bob"), (3, "Annie"), (4, "Ann Lee"), (5, "ANNA")]:
+        platform.add_customer_profile(customer_id, name)
+    return platform
+
+
+def test_get_customer_id(platform):
+    assert platform.get_customer_id("Ann Lee") == 1  # the first of two customers with the name
+    assert platform.get_customer_id("ann lee") == -1
+    assert platform.get_customer_id("ann lee", ignore_case=True) == 1
+    assert platform.get_customer_id("Nobody") == -1
+    assert platform.get_customer_id(7) == 7
+
+
+def test_find_customers_by_prefix(platform):
+    assert platform.find_customers_by_prefix("ann") == [(1, "Ann Lee"), (4, "Ann Lee"), (5, "ANNA"), (3, "Annie")]
+    assert platform.find_customers_by_prefix("ANN", limit=3) == [(1, "Ann Lee"), (4, "Ann Lee"), (5, "ANNA")]
+    assert platform.find_customers_by_prefix("c") == []
+    assert len(platform.find_customers_by_prefix("")) == 5
+
+
+def test_indexes_follow_renames_and_deletes(platform):
+    assert platform.update_customer_name(1, "Zoe")
+    assert platform.get_customer_id("Ann Lee") == 4
+    assert platform.get_customer_id("zoe", ignore_case=True) == 1
+    assert platform.delete_customer_profile(4)
+    assert platform.get_customer_id("Ann Lee") == -1
+    platform.add_customer_profile(3, "Bea")  # replaces profile 3
+    platform.add_customer_profile(6, "Anne")  # added after the list was last sorted
+    assert platform.find_customers_by_prefix("an") == [(5, "ANNA"), (6, "Anne")]
+    assert [cid for cid, _ in platform.find_customers_by_prefix("b")] == [3, 2]
+    assert not platform.update_customer_name(99, "X") and not platform.delete_customer_profile(99)
+
+
+def test_buyers_of_product(platform, monkeypatch):
+    platform.add_product(10, "Pen", 5, 1.0, "Blue", 2)
+    platform.add_product(11, "Cup", 3, 2.0, "Red", 3)
+    platform.add_product(10, "Pen", 9, 1.0, "Blue", 5)
+    platform.add_product(10, "Pen", 9, 1.0, "Blue", 2)
+    assert platform.get_customer_id_by_product(10) == 2
+    assert platform.get_customer_id_by_product(12) == -1
+    assert platform.get_buyers_of_product(10) == ([(2, [0, 1]), (5, [0])], None)
+    assert platform.get_buyers_of_product(10, limit=1) == ([(2, [0, 1])], 1)
+    assert platform.get_buyers_of_product(10, offset=1, limit=1) == ([(5, [0])], None)
+
+    # Deleting stock is recorded as an order of the product's first buyer.
+    monkeypatch.setattr("builtins.input", lambda prompt: "4")
+    platform.delete_product(10)
+    assert platform.get_buyers_of_product(10)[0][0] == (2, [0, 1, 2])
+
+    platform.delete_customer_profile(2)
+    assert platform.get_customer_id_by_product(10) == 5
+    platform.add_customer_profile(5, "Eve")  # a new profile starts with no orders
+    assert platform.get_buyers_of_product(10) == ([], None)
+    assert platform.get_customer_id_by_product(11) == 3
@@ -0,0 +1,151 @@
+import importlib.util
+import os
+import threading
+
+import pytest
+
+PLATFORM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "8.Fix total payment.py")
+
+
+@pytest.fixture(scope="module")
+def platform_module():
+    spec = importlib.util.spec_from_file_location("fix_total_payment", PLATFORM_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def platform(platform_module):
+    platform = platform_module.ECommercePlatform()
+    for customer_id, name in enumerate(["Ann", "Bob"], start=1):
+        platform.add_customer_profile(name, customer_id)
+    for product_id, price in [(1, 2.0), (2, 5.0), (3, 1.5)]:
+        platform.create_product_category(product_id, "Product {}".format(product_id), "Description", 100, price)
+    return platform
+
+
+def billed(platform, customer_name):
+    """The bill worked out from the order history: the latest order of each product at its current price."""
+    latest = {order.product_id: order.quantity for order in platform.check_order_history(customer_name)}
+    return sum(quantity * platform.inventory.get(product_id, {}).get('price', 0) for product_id, quantity in latest.items())
+
+
+def test_running_totals_follow_orders_and_prices(platform):
+    platform.start_to_order("Ann", 1, "Product 1", 3, 2.0, "Description")
+    platform.start_to_order("Ann", 2, "Product 2", 1, 5.0, "Description")
+    platform.start_to_order("Ann", 1, "Product 1", 2, 2.0, "Description")  # replaces the first order of product 1
+    platform.place_orders([("Bob", 1, 4), ("Bob", 3, 2)])
+    assert platform.get_total_payment("Ann") == billed(platform, "Ann") == 9.0
+    assert platform.get_total_payment("Bob") == billed(platform, "Bob") == 11.0
+
+    platform.add_product_price(1, 3.0)
+    platform.create_product_category(3, "Product 3", "Description", 0, 2.5)
+    assert platform.get_total_payment("Ann") == billed(platform, "Ann") == 11.0
+    assert platform.get_total_payment("Bob") == billed(platform, "Bob") == 17.0
+
+    platform.delete_product(3)  # no stock left, so the product is removed and billed at 0
+    assert platform.get_total_payment("Bob") == billed(platform, "Bob") == 12.0
+
+    summary = platform.check_total_payment("Ann")
+    assert summary.total == 11.0
+    assert [(p.product_id, p.total) for p in summary.products] == [(1, 6.0), (2, 5.0)]  # latest order first
+
+
+def test_replacing_a_profile_starts_a_new_bill(platform, platform_module):
+    platform.start_to_order("Ann", 1, "Product 1", 3, 2.0, "Description")
+    platform.add_customer_profile("Ann", 1)
+    assert platform.get_total_payment("Ann") == 0
+    platform.add_product_price(1, 4.0)
+    assert platform.get_total_payment("Ann") == 0
+    assert platform.check_total_payment("Ann").products == []
+    with pytest.raises(platform_module.CustomerNotFound):
+        platform.get_total_payment("Nobody")
+
+
+def test_columnar_inventory_answers_like_a_dict(platform_module):
+    from columnar import ColumnarInventory
+
+    platforms = [platform_module.ECommercePlatform(inventory=make()) for make in (dict, ColumnarInventory)]
+    for platform in platforms:
+        for product_id in range(20):
+            platform.create_product_category(product_id, "Product {}".format(product_id % 3), "Description",
+                                             product_id % 7, float(product_id))
+        platform.update_product_quantity_in_inventory(4, 0)
+        platform.delete_product(4)
+        platform.delete_product(7)
+    dict_platform, columnar_platform = platforms
+    assert sorted(columnar_platform.low_stock_products(2)) == sorted(dict_platform.low_stock_products(2))
+    assert columnar_platform.lowest_in_stock(5) == dict_platform.lowest_in_stock(5)
+    assert columnar_platform.total_stock_value() == dict_platform.total_stock_value()
+    assert dict(columnar_platform.inventory.items()) == dict_platform.inventory
+
+
+def test_concurrent_orders_never_oversell(platform, platform_module):
+    ordered = []
+    barrier = threading.Barrier(8)
+
+    def order(customer_name):
+        barrier.wait()
+        for _ in range(40):
+            try:
+                platform.start_to_order(customer_name, 1, "Product 1", 1, 2.0, "Description")
+            except platform_module.InsufficientStock:
+                continue
+            ordered.append(customer_name)
+
+    threads = [threading.Thread(target=order, args=(name,)) for name in ["Ann", "Bob"] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(ordered) == 100
+    assert platform.check_current_quantity(1) == 0
+    assert platform.reservations == {}
+
+
+def test_reservations_hold_stock_until_committed_or_released(platform):
+    held = platform.reserve_stock(1, 30)
+    released = platform.reserve_stock(1, 50)
+    assert platform.check_current_quantity(1) == 20
+    assert platform.reserve_stock(1, 21) is None
+    assert platform.reserve_stock(9, 1) is None
+
+    assert platform.commit_reservation(held)
+    assert not platform.commit_reservation(held)
+    assert not platform.release_reservation(held)
+    assert platform.check_current_quantity(1) == 20
+
+    assert platform.release_reservation(released)
+    assert not platform.release_reservation(released)
+    assert not platform.commit_reservation(released)
+    assert platform.check_current_quantity(1) == 70
+
+
+@pytest.mark.parametrize("product_id, quantity, error", [
+    (9, 1, "ProductNotFound"),
+    (1, 0, "InvalidQuantity"),
+    (1, 1.5, "InvalidQuantity"),
+    (1, 101, "InsufficientStock"),
+])
+def test_failed_orders_leave_stock_and_history_alone(platform, platform_module, product_id, quantity, error):
+    with pytest.raises(getattr(platform_module, error)):
+        platform.start_to_order("Ann", product_id, "Product", quantity, 2.0, "Description")
+    with pytest.raises(platform_module.CustomerNotFound):
+        platform.start_to_order("Cid", 1, "Product 1", 1, 2.0, "Description")
+    assert platform.check_current_quantity(1) == 100
+    assert platform.check_order_history("Ann") == []
+    assert platform.reservations == {}
+
+
+def test_place_orders_takes_any_iterable_of_lines(platform):
+    result = platform.place_orders((line for line in [("Ann", 1, 4), ("Bob", 3, 2), ("Bob", 1, 1)]))
+    assert result == (True, 3, [])
+    assert platform.check_current_quantity(1) == 95
+    assert [order.quantity for order in platform.check_order_history("Bob")] == [2, 1]
+
+
+def test_place_orders_rejects_an_empty_batch(platform, platform_module):
+    with pytest.raises(platform_module.EmptyBatch):
+        platform.place_orders(iter([]))
+    assert platform.check_order_history("Ann") == platform.check_order_history("Bob") == []
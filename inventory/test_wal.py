@@ -0,0 +1,113 @@
+import importlib.util
+import os
+import threading
+
+import pytest
+
+import wal
+
+PLATFORM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "8.Fix total payment.py")
+
+
+@pytest.fixture(scope="module")
+def platform_module():
+    spec = importlib.util.spec_from_file_location("fix_total_payment", PLATFORM_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def state(platform):
+    """The platform's data, with order histories as lists so that platforms can be compared."""
+    customers = {name: dict(profile, order_history=list(profile['order_history']))
+                 for name, profile in platform.customer_profiles.items()}
+    return (customers, dict(platform.inventory), platform.payment_totals, platform.reservations,
+            platform.stock_levels, platform.stock_buckets)
+
+
+def make_orders(platform):
+    platform.add_customer_profile("Ann", 1)
+    platform.add_customer_profile("Bob", 2)
+    for product_id in range(5):
+        platform.create_product_category(product_id, "Product {}".format(product_id), "Description", 10, 1.5)
+    platform.start_to_order("Ann", 1, "Product 1", 3, 1.5, "Description")
+    platform.place_orders([("Ann", 2, 1), ("Bob", 2, 4), ("Bob", 3, 2)])
+    platform.add_product_price(2, 2.0)
+    platform.update_product_quantity_in_inventory(4, 7)
+    platform.delete_product(0)
+    platform.reserve_stock(3, 1)
+
+
+@pytest.mark.parametrize("snapshot_every", [0, 4])
+def test_replay_restores_the_platform(tmp_path, platform_module, snapshot_every):
+    store = wal.PlatformStore(str(tmp_path), snapshot_every=snapshot_every, sync=False)
+    platform = store.open(platform_module.ECommercePlatform)
+    make_orders(platform)
+    store.close()
+
+    reopened = wal.PlatformStore(str(tmp_path), sync=False)
+    assert state(reopened.open(platform_module.ECommercePlatform)) == state(platform)
+    reopened.close()
+
+
+def test_torn_tail_is_dropped(tmp_path, platform_module):
+    store = wal.PlatformStore(str(tmp_path), snapshot_every=0, sync=False)
+    platform = store.open(platform_module.ECommercePlatform)
+    make_orders(platform)
+    expected = state(platform)
+    segment = store._log.path
+    store.close()
+    whole = os.path.getsize(segment)
+    with open(segment, "ab") as f:
+        f.write(wal.FRAME_HEADER.pack(100, 0) + b"cut short")
+
+    store = wal.PlatformStore(str(tmp_path), snapshot_every=0, sync=False)
+    platform = store.open(platform_module.ECommercePlatform)
+    assert state(platform) == expected
+    assert os.path.getsize(segment) == whole
+    platform.add_customer_profile("Cy", 3)
+    expected = state(platform)
+    store.close()
+
+    store = wal.PlatformStore(str(tmp_path), sync=False)
+    assert state(store.open(platform_module.ECommercePlatform)) == expected
+    store.close()
+
+
+def test_fsync_failure_fails_every_waiter(tmp_path, platform_module, monkeypatch):
+    store = wal.PlatformStore(str(tmp_path), snapshot_every=0, group_commit_delay=0.05)
+    platform = store.open(platform_module.ECommercePlatform)
+    platform.add_customer_profile("Ann", 1)
+    expected = state(platform)
+    written = store._log._written
+
+    def failing_fsync(fd):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    errors = []
+
+    def add_customer(customer_id):
+        try:
+            platform.add_customer_profile("Customer {}".format(customer_id), customer_id)
+        except wal.LogFailed as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add_customer, args=(customer_id,)) for customer_id in range(2, 6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == len(threads)
+    assert store._log._written == written
+    with pytest.raises(wal.LogFailed):
+        platform.add_customer_profile("Dee", 9)
+    monkeypatch.undo()
+    with pytest.raises(wal.LogFailed):
+        store.close()
+    assert platform.store is None
+
+    store = wal.PlatformStore(str(tmp_path))
+    recovered = store.open(platform_module.ECommercePlatform)
+    assert set(state(recovered)[0]) >= set(expected[0])
+    store.close()
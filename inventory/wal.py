@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Write-ahead log and snapshots for ECommercePlatform.
+
+Every mutating platform call is appended to a log as (sequence number,
+method name, args, kwargs, time of the call) before the call returns.  Calls are applied and
+queued one at a time under PlatformStore.lock, so the log replays them in
+the order they happened; the fsync happens after the lock is released, and
+concurrent callers are group committed: one of them writes and fsyncs
+everything queued so far, and the others wait for that single fsync
+instead of doing their own.  If that write or fsync fails, every caller
+waiting on it gets a LogFailed error, and so does every later one: what
+reached the disk is unknown, so the log is not written to again.
+
+Every `snapshot_every` records the platform's attributes are pickled to a snapshot
+and a new log segment is started; older snapshots and segments are then
+deleted.  Opening a store loads the latest snapshot straight from an mmap
+of the file and replays only the log records written after it.
+
+    store = PlatformStore("data")
+    platform = store.open(ECommercePlatform)
+    ...
+    store.close()
+
+Directory layout:
+
+    snapshot-<seq>.pickle   the platform's attributes after record <seq>
+    wal-<seq>.log           records <seq> onwards, as frames of
+                            length (4 bytes), crc32 (4 bytes), pickled record
+"""
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+FRAME_HEADER = struct.Struct('>II')
+SNAPSHOT_PREFIX = 'snapshot-'
+SNAPSHOT_SUFFIX = '.pickle'
+SEGMENT_PREFIX = 'wal-'
+SEGMENT_SUFFIX = '.log'
+
+
+def _file_name(prefix, seq, suffix):
+    return '{}{:020d}{}'.format(prefix, seq, suffix)
+
+
+def _sequence_numbers(directory, prefix, suffix):
+    return sorted(int(name[len(prefix):-len(suffix)]) for name in os.listdir(directory)
+                  if name.startswith(prefix) and name.endswith(suffix))
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_frames(path):
+    """
+    Read the records of a log segment.
+
+    Returns:
+    tuple: The records, and the offset just past the last complete frame.  A
+    torn or corrupt frame ends the segment.
+    """
+    records = []
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(pickle.loads(payload))
+        offset = start + length
+    return records, offset
+
+
+class LogFailed(OSError):
+    """A write or fsync of the log failed; records queued since the last successful one may be lost."""
+
+    def __init__(self, path):
+        super().__init__(f"Write-ahead log {path} failed; reopen the store to recover.")
+        self.path = path
+
+
+class WriteAheadLog:
+    """Append-only log segment with group commit."""
+
+    def __init__(self, path, first, sync=True, group_commit_delay=0.0):
+        self.path = path
+        self.first = first  # sequence number of the segment's first record
+        self.sync = sync
+        self.group_commit_delay = group_commit_delay
+        self._file = open(path, 'ab')
+        self._cond = threading.Condition()
+        self._pending = []
+        self._written = 0  # highest sequence number written and synced
+        self._queued = 0  # highest sequence number queued
+        self._flushing = False
+        self._error = None  # the exception that failed a write or fsync, after which nothing is written
+        self.commits = 0  # number of write + fsync groups
+
+    def enqueue(self, seq, record):
+        """Queue a record; records must be queued in sequence number order."""
+        payload = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        frame = FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._cond:
+            self._check()
+            self._pending.append(frame)
+            self._queued = seq
+
+    def wait(self, seq):
+        """Return once record `seq` (and everything queued before it) is on disk."""
+        with self._cond:
+            while self._written < seq:
+                self._check()
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flush_locked()
+
+    def flush(self):
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            self._check()
+            if self._pending:
+                self._flush_locked()
+
+    def _check(self):
+        if self._error is not None:
+            raise LogFailed(self.path) from self._error
+
+    def _flush_locked(self):
+        # This caller is the group leader: it writes the frames of everyone waiting.
+        self._flushing = True
+        if self.group_commit_delay:
+            self._cond.release()
+            try:
+                time.sleep(self.group_commit_delay)
+            finally:
+                self._cond.acquire()
+        frames, self._pending = self._pending, []
+        upto = self._queued
+        self._cond.release()
+        try:
+            self._file.write(b''.join(frames))
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+        except BaseException as error:
+            # Only _written tells waiters their records are safe, so it stays put.
+            self._cond.acquire()
+            self._flushing = False
+            self._error = error
+            self._cond.notify_all()
+            raise LogFailed(self.path) from error
+        self._cond.acquire()
+        self._flushing = False
+        self._written = upto
+        self.commits += 1
+        self._cond.notify_all()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+
+class PlatformStore:
+    """Persists an ECommercePlatform as snapshots plus a write-ahead log in one directory."""
+
+    def __init__(self, directory, snapshot_every=10000, sync=True, group_commit_delay=0.0):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+        self.group_commit_delay = group_commit_delay
+        self.platform = None
+        self.lock = threading.RLock()  # held while the platform applies a call and queues its record
+        self._snapshot_lock = threading.Lock()
+        self._seq = 0
+        self._since_snapshot = 0
+        self._log = None
+        self.transient = ('store',)
+        self.replayed = 0
+
+    def open(self, factory):
+        """
+        Load the platform from the latest snapshot and the log records after it.
+
+        Parameters:
+        - factory (callable): Creates an empty platform to load the snapshot into.  The platform
+          must have a replay(method, args, kwargs, at) method that calls `method` as of time `at`.
+
+        Returns:
+        The platform, with this store attached so that its mutations are logged.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        snapshots = _sequence_numbers(self.directory, SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX)
+        platform = factory()
+        platform.store = None
+        self.transient = getattr(platform, 'TRANSIENT_ATTRIBUTES', ('store',))
+        if snapshots:
+            # The attributes are restored rather than the object pickled, because the
+            # platform scripts are run as __main__ or loaded under made-up module names.
+            self._seq = snapshots[-1]
+            path = os.path.join(self.directory, _file_name(SNAPSHOT_PREFIX, self._seq, SNAPSHOT_SUFFIX))
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                vars(platform).update(pickle.loads(mapped))
+
+        segments = _sequence_numbers(self.directory, SEGMENT_PREFIX, SEGMENT_SUFFIX)
+        for first in segments:
+            path = os.path.join(self.directory, _file_name(SEGMENT_PREFIX, first, SEGMENT_SUFFIX))
+            records, end = read_frames(path)
+            if end < os.path.getsize(path):
+                # A crash cut the last frame short; drop it so new records follow a whole one.
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+            for seq, method, args, kwargs, at in records:
+                if seq <= self._seq:
+                    continue
+                platform.replay(method, args, kwargs, at)
+                self._seq = seq
+                self._since_snapshot += 1
+                self.replayed += 1
+
+        self.platform = platform
+        self._log = self._open_segment(segments[-1] if segments else self._seq + 1)
+        platform.store = self
+        return platform
+
+    def _open_segment(self, first):
+        path = os.path.join(self.directory, _file_name(SEGMENT_PREFIX, first, SEGMENT_SUFFIX))
+        log = WriteAheadLog(path, first, self.sync, self.group_commit_delay)
+        if self.sync:
+            _fsync_directory(self.directory)
+        return log
+
+    def enqueue(self, method, args, kwargs, at):
+        """Queue the record of one platform call; the caller holds `lock` and has just applied the call."""
+        with self.lock:
+            self._seq += 1
+            self._log.enqueue(self._seq, (self._seq, method, args, kwargs, at))
+            self._since_snapshot += 1
+            return self._seq
+
+    def wait(self, seq):
+        """Return once record `seq` is on disk, taking a snapshot first if one is due."""
+        with self.lock:
+            log = self._log
+            due = self.snapshot_every and self._since_snapshot >= self.snapshot_every
+        # Segments are flushed before they are replaced, so only the current one can be behind.
+        if seq >= log.first:
+            log.wait(seq)
+        if due:
+            self.snapshot(only_if_due=True)
+
+    def snapshot(self, only_if_due=False):
+        """
+        Write the platform to a new snapshot, start a new log segment, and delete the files it replaces.
+
+        The platform is pickled under `lock`, so it holds exactly the records logged so far.
+        Returns the sequence number of the snapshot, or None if only_if_due and another
+        caller has just taken one.
+        """
+        with self._snapshot_lock:
+            return self._snapshot(only_if_due)
+
+    def _snapshot(self, only_if_due):
+        with self.lock:
+            if only_if_due and self._since_snapshot < self.snapshot_every:
+                return None
+            seq = self._seq
+            self._log.close()
+            self._log = self._open_segment(seq + 1)
+            self._since_snapshot = 0
+            attributes = {name: value for name, value in vars(self.platform).items() if name not in self.transient}
+            state = pickle.dumps(attributes, pickle.HIGHEST_PROTOCOL)
+        path = os.path.join(self.directory, _file_name(SNAPSHOT_PREFIX, seq, SNAPSHOT_SUFFIX))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        _fsync_directory(self.directory)
+
+        for old in _sequence_numbers(self.directory, SNAPSHOT_PREFIX, SNAPSHOT_SUFFIX):
+            if old < seq:
+                os.remove(os.path.join(self.directory, _file_name(SNAPSHOT_PREFIX, old, SNAPSHOT_SUFFIX)))
+        for first in _sequence_numbers(self.directory, SEGMENT_PREFIX, SEGMENT_SUFFIX):
+            if first <= seq:
+                os.remove(os.path.join(self.directory, _file_name(SEGMENT_PREFIX, first, SEGMENT_SUFFIX)))
+        return seq
+
+    def close(self):
+        try:
+            if self._log is not None:
+                log, self._log = self._log, None
+                log.close()
+        finally:
+            if self.platform is not None:
+                self.platform.store = None
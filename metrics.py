@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Request, SQL and template timing for app.py, served on /metrics in the
+Prometheus text format.
+
+Set FLASK_METRICS=1 to turn it on.  When it is off, init_app() registers
+nothing and the pool hands out plain sqlite3 connections, so the only cost
+is the one environment lookup at import time.
+"""
+import bisect
+import os
+import re
+import sqlite3
+import threading
+import time
+
+ENABLED = os.environ.get("FLASK_METRICS", "0").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+HELP = {
+    "app_request_duration_seconds": ("histogram", "Time to produce a response, by route."),
+    "app_request_duration_quantile_seconds": ("gauge", "p50/p95/p99 request time estimated from the histogram."),
+    "app_requests_total": ("counter", "Responses sent, by route and status."),
+    "app_sql_query_duration_seconds": ("histogram", "Time spent in execute()/executemany(), by statement."),
+    "app_sql_rows_total": ("counter", "Rows fetched or changed, by statement."),
+    "app_template_render_seconds": ("histogram", "Time to render a template, by template name."),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram; quantiles are interpolated inside the bucket they fall in."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}  # (name, labels) -> number
+        self._collectors = []
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_collector(self, collector):
+        """Register a function returning extra (name, type, help, labels, value) samples."""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        described = set()
+
+        def describe(name, kind=None, text=None):
+            if name not in described:
+                described.add(name)
+                kind, text = HELP.get(name, (kind, text))
+                lines.append("# HELP {} {}".format(name, text))
+                lines.append("# TYPE {} {}".format(name, kind))
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            for (name, labels), h in histograms:
+                describe(name)
+                cumulative = 0
+                for bound, n in zip(self.bucket_labels(h), h.counts):
+                    cumulative += n
+                    lines.append("{}_bucket{} {}".format(name, _labels(labels + (("le", bound),)), cumulative))
+                lines.append("{}_sum{} {}".format(name, _labels(labels), h.sum))
+                lines.append("{}_count{} {}".format(name, _labels(labels), h.count))
+            for (name, labels), h in histograms:
+                if name != "app_request_duration_seconds":
+                    continue
+                describe("app_request_duration_quantile_seconds")
+                for q in QUANTILES:
+                    lines.append("app_request_duration_quantile_seconds{} {}".format(
+                        _labels(labels + (("quantile", str(q)),)), h.quantile(q)))
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append("{}{} {}".format(name, _labels(labels), value))
+        for collector in self._collectors:
+            for name, kind, text, labels, value in collector():
+                describe(name, kind, text)
+                lines.append("{}{} {}".format(name, _labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def bucket_labels(histogram):
+        return [repr(b) for b in histogram.buckets] + ["+Inf"]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels) + "}"
+
+
+registry = Registry()
+
+_IN_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)")
+_statement_labels = {}
+
+
+def statement_label(sql):
+    """Collapse whitespace and IN (?,?,...) lists so each statement gets one label."""
+    label = _statement_labels.get(sql)
+    if label is None:
+        label = _IN_LIST.sub("(?...)", " ".join(sql.split()))[:120]
+        if len(_statement_labels) < 10000:
+            _statement_labels[sql] = label
+    return label
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times execute()/executemany() and counts the rows it returns."""
+
+    _label = None
+
+    def execute(self, sql, parameters=()):
+        self._label = statement_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._label = statement_label(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(started)
+
+    def _record(self, started):
+        labels = (("statement", self._label),)
+        registry.observe("app_sql_query_duration_seconds", labels, time.perf_counter() - started)
+        if self.rowcount > 0:
+            registry.inc("app_sql_rows_total", labels, self.rowcount)
+
+    def _count(self, n):
+        if n and self._label is not None:
+            registry.inc("app_sql_rows_total", (("statement", self._label),), n)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._count(1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods go through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """The sqlite3.connect() factory the connection pool should use."""
+    return InstrumentedConnection if ENABLED else sqlite3.Connection
+
+
+def init_app(app):
+    """Add request and template timing hooks and the /metrics route to a Flask app, if enabled."""
+    if not ENABLED:
+        return
+    from flask import Response, g, request, before_render_template, template_rendered
+
+    def route_labels():
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        return (("route", rule), ("method", request.method))
+
+    def record(status):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return
+        labels = route_labels()
+        registry.observe("app_request_duration_seconds", labels, time.perf_counter() - started)
+        registry.inc("app_requests_total", labels + (("status", str(status)),))
+
+    @app.before_request
+    def start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def stop_timer(response):
+        record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def stop_timer_on_error(exception):
+        # after_request does not run when the view raised; count those as 500s.
+        record(500)
+
+    renders = threading.local()
+
+    def render_started(sender, template, context, **extra):
+        renders.__dict__.setdefault("stack", []).append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        stack = getattr(renders, "stack", None)
+        if stack:
+            registry.observe("app_template_render_seconds", (("template", template.name),),
+                             time.perf_counter() - stack.pop())
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for app.db.
+
+The schema version is kept in SQLite's PRAGMA user_version.  Every entry in
+MIGRATIONS is applied once, in order, in its own transaction.
+
+    python migrations.py            # bring the database up to date
+    python migrations.py --explain  # show the query plan of every route's queries
+"""
+import argparse
+import os
+import sys
+
+from db import data_version_statements, get_pool
+
+# The database configuration
+DATABASE = os.environ.get("FLASK_DATABASE", "app.db")
+
+# data_versions counters and the tables whose writes bump them.
+DATA_VERSIONS = {
+    "products": ("products",),
+    "suppliers": ("suppliers", "addresses"),
+}
+
+MIGRATIONS = [
+    # The composite keys of addresses and shopping_cart are the indexes of
+    # migration 2, so fresh and hand-made databases end up with the same ones.
+    (1, "create tables", [
+        """CREATE TABLE IF NOT EXISTS suppliers (
+            supplier_id INTEGER PRIMARY KEY,
+            supplier_name TEXT NOT NULL,
+            supplier_address INTEGER,
+            status TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS addresses (
+            address_id INTEGER NOT NULL,
+            line_no INTEGER NOT NULL,
+            line_text TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS products (
+            product_id INTEGER PRIMARY KEY,
+            supplier_id INTEGER REFERENCES suppliers (supplier_id),
+            quantity INTEGER NOT NULL DEFAULT 0,
+            short_description TEXT,
+            long_description TEXT,
+            minimum_age INTEGER,
+            input_unit_price REAL,
+            shopper_unit_price REAL
+        )""",
+        """CREATE TABLE IF NOT EXISTS shopping_cart (
+            customer_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL
+        )""",
+    ]),
+    # Duplicate cart lines are merged first so that the unique index the cart
+    # upserts rely on can be built on a hand-made database.
+    (2, "index lookups and joins", [
+        """UPDATE shopping_cart SET quantity = (
+            SELECT SUM(quantity) FROM shopping_cart AS s
+            WHERE s.customer_id = shopping_cart.customer_id AND s.product_id = shopping_cart.product_id
+        ) WHERE rowid IN (
+            SELECT MIN(rowid) FROM shopping_cart GROUP BY customer_id, product_id HAVING COUNT(*) > 1
+        )""",
+        """DELETE FROM shopping_cart WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM shopping_cart GROUP BY customer_id, product_id
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS shopping_cart_customer_product ON shopping_cart (customer_id, product_id)",
+        "CREATE INDEX IF NOT EXISTS addresses_address_line ON addresses (address_id, line_no)",
+        "CREATE INDEX IF NOT EXISTS suppliers_address ON suppliers (supplier_address)",
+        "CREATE INDEX IF NOT EXISTS products_supplier ON products (supplier_id)",
+    ]),
+    (3, "data version counters", [
+        statement
+        for name, tables in DATA_VERSIONS.items()
+        for statement in data_version_statements(name, tables)
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def route_queries():
+    """
+    Return (route, sql, sample parameters) for the queries each route runs, for --explain.
+
+    The SQL is taken from the modules that run it, so the report follows any change to it.
+    """
+    # Imported here because app.py and import_products.py import this module.
+    import app
+    import cart
+    import import_products
+    import supplier_index
+    from db import DATA_VERSION_QUERY
+
+    page = app.DEFAULT_PAGE_SIZE + 1
+    return [
+        ("/products/", *app.rows_query("products", "product_id", None, page)),
+        ("/products/?after=", *app.rows_query("products", "product_id", 0, page)),
+        ("/product/?pid=", app.PRODUCT_QUERY, (1,)),
+        ("/suppliers/", *app.rows_query("suppliers", "supplier_id", None, page)),
+        ("/suppliers/?after=", *app.rows_query("suppliers", "supplier_id", 0, page)),
+        ("/suppliers_v2/", supplier_index.QUERY, ()),
+        ("/import_products/", import_products.existing_ids_query(3), (1, 2, 3)),
+        ("cart.change_quantity", cart.UPSERT, (1, 1, 1, 1)),
+        ("cart.change_quantity", cart.DELETE_EMPTY, (1, 1)),
+        ("data versions", DATA_VERSION_QUERY, ("products",)),
+    ]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's schema version; return the ones applied."""
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        # Take the write lock before re-checking, in case another process got here first.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("PRAGMA user_version = {}".format(version))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
+
+
+def explain(conn):
+    """
+    Return (route, sql, plan lines, index backed) for every query in route_queries().
+
+    A query counts as index backed unless its plan scans a table without an
+    index, uses a temporary B-tree for sorting, or builds an automatic index.
+    Two kinds of query are expected to scan: /suppliers_v2/ reads every
+    supplier, and the first page of a listing reads its table in key order
+    until the LIMIT.
+    """
+    report = []
+    for route, sql, params in route_queries():
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        backed = not any(
+            (line.startswith("SCAN") and "USING" not in line) or "TEMP B-TREE" in line or "AUTOMATIC" in line
+            for line in plan
+        )
+        report.append((route, sql, plan, backed))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--explain", action="store_true", help="print the query plans of the routes")
+    args = parser.parse_args()
+
+    with get_pool(DATABASE).connection() as con:
+        for version, description in migrate(con):
+            print("Applied migration {}: {}".format(version, description))
+        print("Schema version {} of {}.".format(schema_version(con), LATEST_VERSION))
+
+        if args.explain:
+            for route, sql, plan, backed in explain(con):
+                print("\n{} [{}]".format(route, "index" if backed else "SCAN"))
+                print("  " + " ".join(sql.split()))
+                for line in plan:
+                    print("    " + line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import threading
+
+from db import data_version
+
+# Every write to suppliers or addresses bumps this counter in data_versions
+# (through triggers created by migrations.py), so readers in any process can
+# tell their copy is stale.
+VERSION_NAME = "suppliers"
+
+# Every supplier with an address, one row per address line
+QUERY = (
+    "select A.supplier_id, A.supplier_name, B.line_no, B.line_text from suppliers as A inner join addresses as B "
+    "on B.address_id == A.supplier_address ORDER BY A.supplier_id, B.line_no"
+)
+
+
+class SupplierIndex:
+    """
+    Suppliers with their address lines, joined and grouped once per write instead of per request.
+
+    rows() returns the joined rows as the /suppliers_v2/ query always did
+    (supplier_id, supplier_name, line_no, line_text, one row per address line),
+    and suppliers() the same data grouped into one dict per supplier with
+    supplier_id, supplier_name and address_lines (the line texts in line_no
+    order).  The join is only run again when the suppliers data version has
+    changed since the last build.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built = ((), ())  # (rows, suppliers) of the last build
+        self.rebuilds = 0
+
+    def rows_and_suppliers(self, conn):
+        """Both views, taken from the same build."""
+        version = data_version(conn, VERSION_NAME)
+        if version == self._version:
+            return self._built
+        with self._lock:
+            if version != self._version:
+                self._built = self._build(conn)
+                self._version = version
+                self.rebuilds += 1
+            return self._built
+
+    def rows(self, conn):
+        return self.rows_and_suppliers(conn)[0]
+
+    def suppliers(self, conn):
+        return self.rows_and_suppliers(conn)[1]
+
+    @staticmethod
+    def _build(conn):
+        grouped = []
+        current = None
+        rows = tuple(conn.execute(QUERY))
+        for supplier_id, supplier_name, line_no, line_text in rows:
+            if current is None or current["supplier_id"] != supplier_id:
+                current = {"supplier_id": supplier_id, "supplier_name": supplier_name, "address_lines": []}
+                grouped.append(current)
+            current["address_lines"].append(line_text)
+        return rows, tuple(grouped)
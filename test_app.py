@@ -0,0 +1,155 @@
+import io
+
+import pytest
+
+pytest.importorskip("flask")
+
+import app as webapp  # noqa: E402
+
+CSV = (
+    "product_id,supplier_id,quantity,short_description,long_description,minimum_age,input_unit_price,shopper_unit_price\r\n"
+    "1,1,5,Pen,A blue pen,0,0.5,1.25\r\n"
+    "2,1,0,Kite,\"A kite, red\",6,3.0,7.5\r\n"
+)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, "DATABASE", str(tmp_path / "app.db"))
+    # The caches are per process, and each test's database starts again from the same data versions.
+    for cache in (webapp.product_cache, webapp.products_listing_cache, webapp.response_cache):
+        cache.backend.clear()
+    webapp.app.config["TESTING"] = True
+    return webapp.app.test_client()
+
+
+def test_import_products_multipart_upload(client):
+    # Werkzeug spools multipart files to a SpooledTemporaryFile, which TextIOWrapper rejects before Python 3.11.
+    response = client.post("/import_products/", data={"file": (io.BytesIO(CSV.encode()), "products.csv")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert response.get_json()["inserted"] == 2
+
+
+def test_import_products_raw_body(client):
+    response = client.post("/import_products/?format=jsonl",
+                           data=b'{"product_id": 3, "supplier_id": 1, "quantity": 1, "short_description": "Cup", '
+                                b'"long_description": "A cup", "minimum_age": 0, "input_unit_price": 1, '
+                                b'"shopper_unit_price": 2}\n')
+    assert response.status_code == 200
+    assert response.get_json()["inserted"] == 1
+
+
+def test_suppliers_v2_template_context(client, monkeypatch):
+    with webapp.get_pool(webapp.DATABASE).connection() as conn:
+        webapp.migrate(conn)
+        conn.execute("INSERT INTO suppliers VALUES (1, 'Acme', 10, 'active')")
+        conn.executemany("INSERT INTO addresses VALUES (10, ?, ?)", [(2, "Springfield"), (1, "1 Main St")])
+        conn.commit()
+    rendered = {}
+
+    def render_template(name, **context):
+        rendered[name] = context
+        return ""
+
+    monkeypatch.setattr(webapp, "render_template", render_template)
+    assert client.get("/suppliers_v2/").status_code == 200
+    context = rendered["suppliers_v2.html"]
+    # The joined rows the template has always been given, one per address line
+    assert [tuple(row) for row in context["suppliers"]] == [(1, "Acme", 1, "1 Main St"), (1, "Acme", 2, "Springfield")]
+    assert context["suppliers"][0]["line_text"] == "1 Main St"
+    assert context["supplier_groups"] == (
+        {"supplier_id": 1, "supplier_name": "Acme", "address_lines": ["1 Main St", "Springfield"]},)
+
+
+def capture_templates(monkeypatch):
+    rendered = []
+
+    def render_template(name, **context):
+        rendered.append((name, context))
+        return repr(sorted(context.items()))
+
+    monkeypatch.setattr(webapp, "render_template", render_template)
+    return rendered
+
+
+def test_product_pages_see_writes_from_other_processes(client, monkeypatch):
+    rendered = capture_templates(monkeypatch)
+    assert client.get("/products/").status_code == 200
+    assert client.get("/product/?pid=1").status_code == 200
+    assert rendered[-2][1]["products"] == [] and rendered[-1][1]["product"] == []
+
+    # An insert that bypasses the app, as import_products.py run from the command line does
+    with webapp.get_pool(webapp.DATABASE).connection() as conn:
+        webapp.run_import(conn, webapp.READERS["csv"](io.StringIO(CSV)))
+
+    assert client.get("/products/").status_code == 200
+    assert [row[0] for row in rendered[-1][1]["products"]] == [1, 2]
+    assert client.get("/product/?pid=1").status_code == 200
+    assert rendered[-1][1]["product"][0][0] == 1
+
+
+def test_listing_pages_include_keys_of_zero_and_below(client, monkeypatch):
+    rendered = capture_templates(monkeypatch)
+    rows = "".join("{},1,1,P{},D,0,1,2\r\n".format(pid, pid) for pid in range(-1, 5))
+    with webapp.get_pool(webapp.DATABASE).connection() as conn:
+        webapp.migrate(conn)
+        report = webapp.run_import(conn, webapp.READERS["csv"](io.StringIO(CSV.splitlines()[0] + "\r\n" + rows)))
+    assert report["inserted"] == 6
+
+    assert client.get("/products/").status_code == 200
+    assert [row[0] for row in rendered[-1][1]["products"]] == [-1, 0, 1, 2, 3, 4]
+
+    seen, after = [], ""
+    while after is not None:
+        assert client.get("/products/?limit=4" + after).status_code == 200
+        context = rendered[-1][1]
+        seen += [row[0] for row in context["products"]]
+        after = None if context["next_after"] is None else "&after={}".format(context["next_after"])
+    assert seen == [-1, 0, 1, 2, 3, 4]
+
+
+def test_add_product_invalidates_the_product_caches(client, monkeypatch):
+    rendered = capture_templates(monkeypatch)
+    assert client.get("/product/?pid=7").status_code == 200
+    assert rendered[-1][1]["product"] == []
+    invalidations = webapp.product_cache.invalidations
+    form = {"product_id": 7, "supplier_id": 1, "quantity": 2, "short_description": "Mug", "long_description": "A mug",
+            "minimum_age": 0, "input_unit_price": 1.0, "shopper_unit_price": 2.5}
+    assert client.post("/add_product/", data=form).status_code == 302
+    assert webapp.product_cache.invalidations == invalidations + 1
+    assert client.get("/product/?pid=7").status_code == 200
+    assert rendered[-1][1]["product"][0][:4] == (7, 1, 2, "Mug")
+
+
+@pytest.mark.parametrize("fmt, body", [
+    ("csv", CSV.encode() + b"3,1,1,Caf\xe9,Latin-1,0,1,2\r\n"),
+    ("csv", CSV.encode() + b"3,1,1," + b"x" * 200000 + b",x,0,1,2\r\n"),  # over csv.field_size_limit()
+    ("jsonl", b'{"product_id": 1, "supplier_id": 1, "quantity": 1, "short_description": "Cup", '
+              b'"long_description": "A cup", "minimum_age": 0, "input_unit_price": 1, "shopper_unit_price": 2}\n'
+              b'{"product_id": 2, "short_description": "Caf\xe9"}\n{not json\n'),
+], ids=["latin-1", "bad-csv", "jsonl"])
+def test_import_products_rejects_unreadable_lines(client, fmt, body):
+    response = client.post("/import_products/?format=" + fmt, data=body)
+    assert response.status_code == 400
+    report = response.get_json()
+    assert report["inserted"] >= 1
+    assert report["malformed"] >= 1
+    assert any(reject["reason"].startswith("invalid") for reject in report["rejected_rows"])
+
+
+def test_cached_pages_answer_conditional_requests(client, monkeypatch):
+    rendered = capture_templates(monkeypatch)
+    first = client.get("/products/")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and etag
+    again = client.get("/products/", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert len(rendered) == 1  # served from response_cache
+
+    with webapp.get_pool(webapp.DATABASE).connection() as conn:
+        webapp.run_import(conn, webapp.READERS["csv"](io.StringIO(CSV)))
+    changed = client.get("/products/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(rendered) == 2
+    assert webapp.response_cache.stats()["bytes"] == sum(len(r.data) for r in (first, changed))
@@ -0,0 +1,130 @@
+import pickle
+
+import pytest
+
+from cache import ClientBackend, LRUCache, ReadThroughCache
+
+
+class StrictClient:
+    """In-memory stand-in for pymemcache's Client that validates keys the same way."""
+
+    def __init__(self):
+        self.data = {}
+
+    @staticmethod
+    def _check(key):
+        if not isinstance(key, str) or len(key.encode()) > 250:
+            raise ValueError("Key is too long or not a str: {!r}".format(key))
+        if any(c.isspace() or ord(c) < 33 or ord(c) == 127 for c in key):
+            raise ValueError("Key contains whitespace: {!r}".format(key))
+
+    def get(self, key):
+        self._check(key)
+        return self.data.get(key)
+
+    def set(self, key, value, expire=0):
+        self._check(key)
+        self.data[key] = value
+
+    def delete(self, key):
+        self._check(key)
+        self.data.pop(key, None)
+
+    def flush_all(self):
+        self.data.clear()
+
+
+# The keys app.py and asgi_app.py actually use
+KEY_SHAPES = [
+    9,
+    (0, 100),
+    (1500, 1000),
+    ("/products/", b"", 5),
+    ("/products/", b"after=100&limit=50", 1697650000),
+    ("/suppliers/" + "x" * 400, b"a=" + b"y" * 400, 3),
+]
+
+
+@pytest.mark.parametrize("backend", [lambda: ClientBackend(StrictClient()), LRUCache], ids=["client", "lru"])
+def test_real_key_shapes(backend):
+    cache = ReadThroughCache("pages", backend())
+    for key in KEY_SHAPES:
+        assert cache.get_or_load(key, lambda: ("body", key)) == ("body", key)
+        assert cache.get_or_load(key, lambda: pytest.fail("loaded twice")) == ("body", key)
+    assert cache.hits == cache.misses == len(KEY_SHAPES)
+
+
+def test_invalidate_with_client_backend():
+    client = StrictClient()
+    cache = ReadThroughCache("products", ClientBackend(client))
+    cache.get_or_load((0, 100), lambda: "old")
+    cache.invalidate((0, 100))
+    assert cache.get_or_load((0, 100), lambda: "new") == "new"
+    cache.invalidate_all()
+    assert cache.get_or_load((0, 100), lambda: "newer") == "newer"
+    assert all(pickle.loads(value) is not None for value in client.data.values())
+
+
+def test_keys_are_distinct():
+    cache = ReadThroughCache("products", LRUCache())
+    assert cache._key((0, 100)) != cache._key((0, 10))
+    assert cache._key(1) != cache._key("1")
+
+
+def test_invalidate_drops_only_that_key():
+    cache = ReadThroughCache("product", LRUCache())
+    cache.get_or_load(1, lambda: "one")
+    cache.get_or_load(2, lambda: "two")
+    cache.invalidate(1)
+    assert cache.get_or_load(1, lambda: "one again") == "one again"
+    assert cache.get_or_load(2, lambda: pytest.fail("invalidated")) == "two"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 3, 1)
+    assert stats["hit_ratio"] == 0.25
+
+
+def test_invalidate_all_survives_losing_the_generation():
+    backend = LRUCache()
+    cache = ReadThroughCache("products", backend)
+    cache.get_or_load((0, 100), lambda: "old")
+    cache.invalidate_all()
+    assert cache.get_or_load((0, 100), lambda: "new") == "new"
+    # Evicting the generation entry must not bring back entries from before the bump.
+    backend.delete("products:generation")
+    assert cache.get_or_load((0, 100), lambda: "newest") == "newest"
+
+
+def test_lru_evicts_least_recently_used():
+    backend = LRUCache(maxsize=2, ttl=None)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (1, None, 3)
+    assert backend.stats()["evictions"] == 1
+
+
+def test_lru_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    backend = LRUCache(ttl=10)
+    backend.set("a", 1)
+    now[0] += 9
+    assert backend.get("a") == 1
+    now[0] += 1
+    assert backend.get("a") is None
+    assert backend.stats()["expirations"] == 1
+
+
+def test_lru_bounded_by_bytes():
+    backend = LRUCache(ttl=None, maxbytes=10, weigh=len)
+    backend.set("a", b"1234")
+    backend.set("b", b"5678")
+    backend.set("a", b"12")  # replacing an entry gives back its bytes
+    backend.set("c", b"90")
+    assert backend.stats()["bytes"] == 8 and backend.stats()["evictions"] == 0
+    backend.set("d", b"abcd")
+    assert (backend.get("b"), backend.get("a")) == (None, b"12")
+    backend.set("e", b"x" * 11)  # larger than the whole cache
+    assert backend.get("e") is None
+    assert backend.stats()["bytes"] <= 10
@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+import cart
+from migrations import migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "app.db"))
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def cart_lines(conn):
+    return conn.execute("SELECT customer_id, product_id, quantity FROM shopping_cart ORDER BY 1, 2").fetchall()
+
+
+def test_change_quantity_adds_and_removes_lines(conn):
+    assert cart.increment(conn, 1, 1, 3) == 3
+    assert cart.decrement(conn, 1, 1) == 2
+    assert cart.decrement(conn, 1, 1, 5) == 0
+    assert cart_lines(conn) == []
+
+
+@pytest.mark.parametrize("apply", [
+    lambda conn, delta: cart.change_quantity(conn, 1, 1, delta),
+    lambda conn, delta: cart.apply_changes(conn, [(1, 1, delta)]),
+], ids=["change_quantity", "apply_changes"])
+def test_a_line_left_at_zero_is_removed_by_any_change(conn, apply):
+    # A line holding 0, e.g. from before the delete-on-zero rule
+    conn.execute("INSERT INTO shopping_cart VALUES (1, 1, 0)")
+    conn.commit()
+    apply(conn, 0)
+    assert cart_lines(conn) == []
+
+
+def test_apply_changes_is_all_or_nothing(conn):
+    assert cart.apply_changes(conn, [(1, 1, 2), (1, 2, 1), (1, 2, -1), (2, 1, 4)]) == 4
+    assert cart_lines(conn) == [(1, 1, 2), (2, 1, 4)]
+    with pytest.raises(sqlite3.Error):
+        cart.apply_changes(conn, [(1, 1, 1), (1, None, 1)])
+    assert cart_lines(conn) == [(1, 1, 2), (2, 1, 4)]
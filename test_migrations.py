@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+import migrations
+
+pytest.importorskip("flask")
+
+import app as webapp  # noqa: E402
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "app.db"))
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+def test_migrate_once(conn):
+    assert [version for version, _ in migrations.migrate(conn)] == [1, 2, 3]
+    assert migrations.migrate(conn) == []
+    assert migrations.schema_version(conn) == migrations.LATEST_VERSION
+
+
+class RecordingConnection:
+    """Passes execute() calls on to a connection, keeping the SQL of each."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.statements = []
+
+    def execute(self, sql, parameters=()):
+        self.statements.append(sql)
+        return self.conn.execute(sql, parameters)
+
+
+def test_explained_queries_are_the_ones_the_routes_run(conn):
+    migrations.migrate(conn)
+    recorder = RecordingConnection(conn)
+    webapp.load_page(recorder, "products", "product_id", None, webapp.DEFAULT_PAGE_SIZE)
+    webapp.load_page(recorder, "suppliers", "supplier_id", 0, webapp.DEFAULT_PAGE_SIZE)
+    webapp.load_product(recorder, 1)
+    webapp.supplier_index._build(recorder)
+    explained = {sql for _, sql, _ in migrations.route_queries()}
+    assert len(recorder.statements) == 4
+    assert set(recorder.statements) <= explained
+
+
+def test_only_expected_scans(conn):
+    migrations.migrate(conn)
+    scans = [route for route, _, _, backed in migrations.explain(conn) if not backed]
+    assert scans == ["/products/", "/suppliers/", "/suppliers_v2/"]
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from migrations import migrate
+from supplier_index import SupplierIndex
+
+
+@pytest.fixture
+def connections(tmp_path):
+    path = str(tmp_path / "app.db")
+    reader, writer = sqlite3.connect(path), sqlite3.connect(path)
+    migrate(writer)
+    writer.execute("INSERT INTO suppliers VALUES (2, 'Bolt', 20, 'active')")
+    writer.execute("INSERT INTO suppliers VALUES (1, 'Acme', 10, 'active')")
+    writer.execute("INSERT INTO suppliers VALUES (3, 'No address', 30, 'active')")
+    writer.executemany("INSERT INTO addresses VALUES (?, ?, ?)",
+                       [(10, 2, "Springfield"), (10, 1, "1 Main St"), (20, 1, "2 Side St")])
+    writer.commit()
+    yield reader, writer
+    reader.close()
+    writer.close()
+
+
+def test_rows_and_groups(connections):
+    reader, _ = connections
+    index = SupplierIndex()
+    rows, groups = index.rows_and_suppliers(reader)
+    assert [tuple(row) for row in rows] == [(1, "Acme", 1, "1 Main St"), (1, "Acme", 2, "Springfield"),
+                                            (2, "Bolt", 1, "2 Side St")]
+    assert groups == ({"supplier_id": 1, "supplier_name": "Acme", "address_lines": ["1 Main St", "Springfield"]},
+                      {"supplier_id": 2, "supplier_name": "Bolt", "address_lines": ["2 Side St"]})
+    assert index.rows(reader) is rows and index.suppliers(reader) is groups
+
+
+def test_rebuilt_only_after_a_write(connections):
+    reader, writer = connections
+    index = SupplierIndex()
+    index.suppliers(reader)
+    index.suppliers(reader)
+    assert index.rebuilds == 1
+
+    # Writes from another connection, as another worker process would make them
+    writer.execute("INSERT INTO addresses VALUES (30, 1, '3 Far Rd')")
+    writer.commit()
+    assert [group["supplier_name"] for group in index.suppliers(reader)] == ["Acme", "Bolt", "No address"]
+    writer.execute("UPDATE suppliers SET supplier_name = 'Acme Ltd' WHERE supplier_id = 1")
+    writer.commit()
+    assert index.suppliers(reader)[0]["supplier_name"] == "Acme Ltd"
+    assert index.rebuilds == 3